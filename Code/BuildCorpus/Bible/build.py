@@ -1,9 +1,14 @@
 import os
 import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 
-from Code.BuildCorpus.Bible.utils import word_extract, word_cite_extract
+from Code.BuildCorpus.Bible.utils import word_cite_split
+from Code.BuildCorpus.manifest import BuildManifest, file_hash
+from Code.utils.packed import pack
+
+FULL_PATTERN = re.compile(r'NT|LXX')
 
 
 class BuildBible(object):
@@ -15,14 +20,19 @@ class BuildBible(object):
         'verse': 1
     }
 
-    def __init__(self, folders, dest, split_level, re_pattern='.+?lem="([^"]*).*'):
+    AGGREGATED = {'none', 'corpus'}
+    # Recorded in the manifest : bump it whenever a change of the code changes the outputs, to rebuild them all
+    VERSION = 1
+
+    def __init__(self, folders, dest, split_level=None, re_pattern='.+?lem="([^"]*).*', manifest=None):
         """
 
         :param folders: the folders where the .txt files are located
         :type folders: [str]
-        :param dest: the directory in which to save the transformed corpus files
-        :type dest: str
-        :param split_level: the level at which to split
+        :param dest: the directory in which to save the transformed corpus files, or a dictionary of the directory of
+            each split level to build them all while reading the source files once
+        :type dest: str or {str: str}
+        :param split_level: the level at which to split, ignored if dest is a dictionary
             'none': all files in all folders are joined together in one large .txt file
             'corpus': all files in each of the folders are joined with each other, producing as many .txt files as folders
             'book': one .txt file is produced for each biblical book
@@ -31,15 +41,27 @@ class BuildBible(object):
         :type split_level: str
         :param re_pattern: the regex pattern that will find the desired words
         :type re_pattern: str
+        :param manifest: the path of the record of the source files built (Default: .manifest.json in the common
+            directory of the destinations)
+        :type manifest: str
         """
         self.filenames = []
         for folder in folders:
             self.filenames += glob('{}/*.txt'.format(folder))
-        if not os.path.isdir(dest):
-            os.makedirs(dest)
-        self.dest = dest
-        self.split_level = split_level
+        if isinstance(dest, dict):
+            self.dests = dict(dest)
+            self.dest, self.split_level = None, None
+        else:
+            self.dests = {split_level: dest}
+            self.dest, self.split_level = dest, split_level
+        for directory in self.dests.values():
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
         self.pattern = r'{}'.format(re_pattern)
+        self.regex = re.compile(self.pattern)
+        if manifest is None:
+            manifest = os.path.join(os.path.commonpath(list(self.dests.values())), '.manifest.json')
+        self.manifest = manifest
 
     def build_word_list(self, f):
         """
@@ -58,47 +80,252 @@ class BuildBible(object):
             The dictionary keys are the names of the split sections, e.g., corpus. book, chapter, verse
         :rtype: {str: list}
         """
-        words = defaultdict(list)
-        if self.split_level == 'none':
-            for file in self.filenames:
-                with open(file) as f:
-                    words['Full'] += word_extract(f.read().split('\n'), self.pattern)
-            return words
-        elif self.split_level == 'corpus':
-            for file in self.filenames:
-                corpus = file.split('/')[-2]
-                with open(file) as f:
-                    words[corpus] += word_extract(f.read().split('\n'), self.pattern)
-            return words
+        return self.split_levels([self.split_level])[self.split_level]
+
+    def split_file(self, file, levels):
+        """ Separates the text of one .txt file at several split levels, reading it once and extracting the word and
+            the citation of each line together
+
+        :param file: the path of the file
+        :type file: str
+        :param levels: the split levels
+        :type levels: [str]
+        :return: dictionary of the split lists of words of the file for each split level
+        :rtype: {str: {str: list}}
+        """
+        corpus = file.split('/')[-2]
+        with open(file) as f:
+            lines = list(word_cite_split(f.read().split('\n'), self.regex))
+        split = {}
+        for level in levels:
+            if level == 'none':
+                split[level] = {'Full': [word for word, _ in lines]}
+            elif level == 'corpus':
+                split[level] = {corpus: [word for word, _ in lines]}
+            else:
+                join_int = self.SPLITLEVELDICT[level]
+                words = defaultdict(list)
+                for word, cite in lines:
+                    words[corpus + '/' + '/'.join(cite[:-join_int])].append(word)
+                split[level] = words
+        return split
+
+    def split_levels(self, levels=None, filenames=None, jobs=1):
+        """ Separates the texts contained in the .txt files at several split levels, reading each file once
+
+        :param levels: the split levels (Default: the levels of self.dests)
+        :type levels: [str]
+        :param filenames: the files to read (Default: self.filenames)
+        :type filenames: [str]
+        :param jobs: the number of processes reading files
+        :type jobs: int
+        :return: dictionary of the split_text() dictionary of each split level
+        :rtype: {str: {str: list}}
+        """
+        if levels is None:
+            levels = list(self.dests.keys())
+        if filenames is None:
+            filenames = self.filenames
+        split = {level: defaultdict(list) for level in levels}
+        for file, file_split in zip(filenames, self.map_files(filenames, levels, jobs)):
+            for level in levels:
+                if level in self.AGGREGATED:
+                    for c, words in file_split[level].items():
+                        split[level][c] += words
+                else:
+                    split[level].update(file_split[level])
+        return split
+
+    def map_files(self, filenames, levels, jobs=1):
+        """ Runs split_file over files, in a process pool if jobs > 1
+
+        :return: generator of the split_file() dictionary of each file, in the order of filenames
+        """
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for file_split in executor.map(self.split_file, filenames, [levels] * len(filenames), chunksize=8):
+                    yield file_split
         else:
-            join_int = self.SPLITLEVELDICT[self.split_level]
-            for file in self.filenames:
-                corpus = file.split('/')[-2]
-                with open(file) as f:
-                    words.update(word_cite_extract(f.read().split('\n'), self.pattern, join_int, corpus))
-            return words
-
-    def build_transformed(self, cite_dict):
+            for file in filenames:
+                yield self.split_file(file, levels)
+
+    def paths(self, c, dest, split_level):
+        """ Paths of the files written for one citation unit, including its NT/LXX -> Full mirror
+
+        :param c: the citation unit
+        :type c: str
+        :param dest: the directory in which the files are saved
+        :type dest: str
+        :param split_level: the split level of the citation unit
+        :type split_level: str
+        :rtype: [str]
         """
+        paths = ['{}/{}.txt'.format(dest, c)]
+        if self.SPLITLEVELDICT.get(split_level, 0) != 0:
+            paths.append('{}/{}.txt'.format(dest, FULL_PATTERN.sub('Full', c)))
+        return paths
+
+    def build_transformed(self, cite_dict, dest=None, split_level=None):
+        """ Writes one file per citation unit, creating each directory once
 
         :param cite_dict: dictionary of all the citation units as keys and their list of words as values
         :type cite_dict: {str: list}
+        :param dest: the directory in which to save the files (Default: self.dest)
+        :type dest: str
+        :param split_level: the split level of cite_dict (Default: self.split_level)
+        :type split_level: str
+        :return: the paths written
+        :rtype: [str]
         """
-        for c, words in cite_dict.items():
-            dest_dir = '{}/{}'.format(self.dest, '/'.join(c.split('/')[:-1]))
-            if not os.path.isdir(dest_dir):
-                os.makedirs(dest_dir)
-            with open('{}/{}.txt'.format(self.dest, c), mode='w') as f:
+        if dest is None:
+            dest, split_level = self.dest, self.split_level
+        files = [(path, words) for c, words in cite_dict.items() for path in self.paths(c, dest, split_level)]
+        for directory in sorted({os.path.dirname(path) for path, _ in files}):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        for path, words in files:
+            with open(path, mode='w') as f:
                 f.write(' '.join(words))
-            if self.SPLITLEVELDICT[self.split_level] != 0:
-                dest_dir = re.sub(r"NT|LXX", 'Full', dest_dir)
-                if not os.path.isdir(dest_dir):
-                    os.makedirs(dest_dir)
-                c = re.sub(r'NT|LXX', 'Full', c)
-                with open('{}/{}.txt'.format(self.dest, c), mode='w') as f:
-                    f.write(' '.join(words))
-
-    def run(self):
-        """ Convenience function to run all functions in the class
+        return [path for path, _ in files]
+
+    def packed_groups(self, paths):
+        """ Packed corpora containing some output files : a file at the top of a destination is packed alone, a file in
+            a directory at the top of a destination with every file of this directory
+
+        :param paths: the output files
+        :type paths: [str]
+        :return: dictionary of the files of each packed corpus, keyed by its path (See Code.utils.packed)
+        :rtype: {str: [str]}
+        """
+        groups = {}
+        for dest in self.dests.values():
+            for path in paths:
+                if not path.startswith(dest + '/'):
+                    continue
+                relative = path[len(dest) + 1:]
+                if '/' not in relative:
+                    if os.path.isfile(path):
+                        groups[path[:-len('.txt')] + '.packed'] = [path]
+                else:
+                    top = '{}/{}'.format(dest, relative.split('/')[0])
+                    if top + '.packed' not in groups:
+                        groups[top + '.packed'] = glob('{}/**/*.txt'.format(top), recursive=True)
+        return groups
+
+    def group(self, file, level):
+        """ Key of the files whose words are joined in the same output as @file at an aggregated split level """
+        if level == 'none':
+            return None
+        return file.split('/')[-2]
+
+    def run(self, jobs=1, incremental=False, packed=False):
+        """ Convenience function to run all functions in the class, building every split level of self.dests
+
+        The hash of each source file and the files it was built into are recorded in self.manifest. With
+        @incremental, only the sources that changed since the last build or one of whose outputs is missing are read
+        again (along with the other sources joined with them at the 'none' and 'corpus' levels), and the outputs of
+        removed sources are deleted.
+
+        :param jobs: the number of processes reading source files
+        :type jobs: int
+        :param incremental: only rebuild the outputs of the source files that changed
+        :type incremental: bool
+        :param packed: also write the packed corpora of the outputs (See packed_groups), that W2VModel reads with
+            packed=True
+        :type packed: bool
+        """
+        levels = list(self.dests.keys())
+        manifest, hashes, changed, removed = self.changes(incremental, packed)
+        if changed is None:
+            return
+        previous = manifest.outputs()
+
+        touched = {
+            level: {self.group(file, level) for file in list(changed) + removed}
+            for level in levels if level in self.AGGREGATED
+        }
+        filenames = [
+            file for file in self.filenames
+            if file in changed or any(self.group(file, level) in groups for level, groups in touched.items())
+        ]
+        outputs = defaultdict(list)
+        split = {level: defaultdict(list) for level in levels}
+        for file, file_split in zip(filenames, self.map_files(filenames, levels, jobs)):
+            for level in levels:
+                for c in file_split[level]:
+                    outputs[file] += self.paths(c, self.dests[level], level)
+                if level in self.AGGREGATED:
+                    for c, words in file_split[level].items():
+                        split[level][c] += words
+                elif file in changed:
+                    split[level].update(file_split[level])
+        for level in levels:
+            self.build_transformed(split[level], self.dests[level], level)
+
+        for file in removed:
+            manifest.forget(file)
+        for file in filenames:
+            if file in changed:
+                manifest.record(file, hashes[file], outputs[file])
+        self.clean(manifest, previous, [path for paths in outputs.values() for path in paths], packed)
+
+    def changes(self, incremental=False, packed=False):
+        """ Finds the source files to build, all of them unless @incremental
+
+        :param incremental: only return the source files that changed since the last build
+        :type incremental: bool
+        :param packed: whether packed corpora are written, a change of which rebuilds everything
+        :type packed: bool
+        :return: the manifest, the hash of each source file, the changed and the removed source files, the changed
+            ones being None if everything is up to date
+        :rtype: (BuildManifest, {str: str}, set, list)
+        """
+        manifest = BuildManifest(self.manifest, settings={
+            'builder': type(self).__name__, 'version': self.VERSION,
+            'pattern': self.pattern, 'dests': self.dests, 'packed': packed
+        })
+        hashes = {file: file_hash(file) for file in self.filenames}
+        if not incremental:
+            return manifest, hashes, set(self.filenames), list(manifest.sources.keys())
+        changed, removed = set(manifest.changed(hashes)), manifest.removed(hashes)
+        if not changed and not removed:
+            print('{} is up to date'.format(', '.join(sorted(self.dests.values()))))
+            return manifest, hashes, None, removed
+        return manifest, hashes, changed, removed
+
+    def remove_empty_parents(self, path):
+        """ Deletes the directories left empty above a deleted output, up to the destination containing it, excluded
+
+        :param path: the deleted output
+        :type path: str
+        """
+        roots = [os.path.normpath(dest) for dest in self.dests.values()]
+        directory = os.path.dirname(os.path.normpath(path))
+        while any(directory.startswith(root + os.sep) for root in roots):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def clean(self, manifest, previous, written, packed=False):
+        """ Deletes the outputs no source produces anymore, writes the packed corpora and saves the manifest
+
+        :param manifest: the manifest, updated with the sources built
+        :type manifest: BuildManifest
+        :param previous: the outputs recorded before the build
+        :type previous: set
+        :param written: the outputs written by the build
+        :type written: [str]
+        :param packed: write the packed corpora of the outputs written or deleted
+        :type packed: bool
         """
-        self.build_transformed(self.split_text())
+        stale = previous - manifest.outputs()
+        for path in sorted(stale):
+            if os.path.isfile(path):
+                os.remove(path)
+                self.remove_empty_parents(path)
+        if packed:
+            for path, files in self.packed_groups(list(written) + sorted(stale)).items():
+                pack(files, path)
+        manifest.save()
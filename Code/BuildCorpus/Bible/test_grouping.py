@@ -1,7 +1,11 @@
 import random
 from glob import glob
 
+import numpy as np
+from scipy import sparse
+
 class CreateTestGroups(object):
+    COMBINATIONS = [(3, 1), (3, 3), (5, 1), (5, 3), (5, 5), (10, 1), (10, 5), (10, 10)]
 
     def __init__(self, source, dest, count_1=3, count_2=1, min_size=1):
         """
@@ -123,3 +127,96 @@ class CreateTestGroups(object):
         """
         with open(self.dest, mode="w") as f:
             f.write('\n'.join(self.produce_testing_TSV(self.produce_domain_pairs())))
+
+    def valid_pairs(self):
+        """ Computes once which ordered pairs of domains follow the guidelines of produce_domain_pairs, with the
+            disjointness of their words actually checked
+
+        :return: the sorted domain names, their unique words and the (domains, domains) matrix of valid pairs
+        :rtype: (list, list, np.ndarray)
+        """
+        names = sorted(self.domains.keys())
+        words = [list(dict.fromkeys(self.domains[name])) for name in names]
+        vocabulary = {}
+        rows = [i for i, domain_words in enumerate(words) for _ in domain_words]
+        columns = [vocabulary.setdefault(w, len(vocabulary)) for domain_words in words for w in domain_words]
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)), shape=(len(names), max(len(vocabulary), 1))
+        )
+        shared = incidence.dot(incidence.T).toarray() > 0
+        parents = np.array([name[:3] for name in names])
+        sizes = np.array([len(domain_words) for domain_words in words])
+        valid = (parents[:, None] != parents[None, :]) & ~shared
+        valid &= (parents != '(93')[:, None]
+        valid &= (sizes >= self.min_size)[:, None] & (sizes >= self.min_size)[None, :]
+        return names, words, valid
+
+    @staticmethod
+    def sample_words(words, domains, length, random_state):
+        """ Draws, without replacement, @length words from each of @domains at once
+
+        :param words: the unique words of each domain
+        :type words: [[str]]
+        :param domains: the domain of each draw
+        :type domains: np.ndarray
+        :param length: the number of words drawn from each domain
+        :type length: int
+        :param random_state: the random generator
+        :type random_state: np.random.RandomState
+        :return: one list of words per draw
+        :rtype: [[str]]
+        """
+        sizes = np.array([len(words[domain]) for domain in domains])
+        keys = random_state.random_sample((len(domains), sizes.max()))
+        keys[np.arange(sizes.max())[None, :] >= sizes[:, None]] = np.inf
+        chosen = np.argsort(keys, axis=1, kind='mergesort')[:, :length]
+        return [[words[domain][i] for i in row] for domain, row in zip(domains, chosen)]
+
+    def generate(self, dest, combinations=None, seed=0, count=100):
+        """ Writes one testing TSV per (count_1, count_2) combination, in the format of produce_testing_TSV
+
+        The valid pairs of domains are computed once. For each combination, @count distinct pairs whose domains hold
+        enough words are drawn without replacement, and the words of every group are drawn at once. The random
+        generator of each combination is seeded with (seed, count_1, count_2), so that a file does not change when
+        other combinations are added.
+
+        :param dest: the path of the files, formatted with count_1 and count_2,
+            e.g. 'data/domain_pairs_Correct_{count_1}_Wrong_{count_2}.txt'
+        :type dest: str
+        :param combinations: the (count_1, count_2) combinations (Default: CreateTestGroups.COMBINATIONS)
+        :type combinations: [(int, int)]
+        :param seed: the seed of the random generators
+        :type seed: int
+        :param count: the number of testing groups of each file
+        :type count: int
+        :raises ValueError: if fewer than @count pairs of domains can provide the words of a combination
+        :return: the path written for each combination
+        :rtype: {(int, int): str}
+        """
+        if combinations is None:
+            combinations = self.COMBINATIONS
+        names, words, valid = self.valid_pairs()
+        sizes = np.array([len(domain_words) for domain_words in words])
+        written = {}
+        for count_1, count_2 in combinations:
+            candidates = np.flatnonzero(valid & (sizes >= count_1)[:, None] & (sizes >= count_2)[None, :])
+            if len(candidates) < count:
+                raise ValueError('Only {} pairs of domains can provide {} and {} words, {} are needed'.format(
+                    len(candidates), count_1, count_2, count
+                ))
+            random_state = np.random.RandomState([seed, count_1, count_2])
+            pairs = candidates[random_state.choice(len(candidates), count, replace=False)]
+            firsts, seconds = pairs // len(names), pairs % len(names)
+            words_1 = self.sample_words(words, firsts, count_1, random_state)
+            words_2 = self.sample_words(words, seconds, count_2, random_state)
+            path = dest.format(count_1=count_1, count_2=count_2)
+            with open(path, mode='w') as f:
+                f.write('\n'.join(
+                    '{d1}\t{d2}\t{n1}\t{n2}\t{w1}\t{w2}'.format(
+                        d1=names[first], d2=names[second], n1=count_1, n2=count_2,
+                        w1='\t'.join(group_1), w2='\t'.join(group_2)
+                    )
+                    for first, second, group_1, group_2 in zip(firsts, seconds, words_1, words_2)
+                ))
+            written[(count_1, count_2)] = path
+        return written
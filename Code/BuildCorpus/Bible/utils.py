@@ -1,6 +1,8 @@
 import re
 from collections import defaultdict
 
+ID_PATTERN = re.compile('.+?id="([^"]*).*')
+
 
 def word_extract(text, pattern):
     """ Extracts a list of words from a list of strings in which these words are embedded.
@@ -35,9 +37,24 @@ def word_cite_extract(text, pattern, split_int, corpus):
     """
     words = defaultdict(list)
     for line in text:
-        c = re.sub('.+?id="([^"]*).*', r'\1', line).replace('/', '-')
+        c = ID_PATTERN.sub(r'\1', line).replace('/', '-')
         c = '/'.join(c.split('.')[:-split_int])
         c = corpus + '/' + c
         word = re.sub(pattern, r'\1', line)
         words[c].append(word)
-    return words
\ No newline at end of file
+    return words
+
+
+def word_cite_split(text, pattern):
+    """ Extracts the word and the elements of the citation string from each string in the list, in one pass.
+        Only one words and citation string are extracted per list element.
+
+    :param text: list of strings that contain the words
+    :type text: list
+    :param pattern: compiled regex pattern to use to extract the words from the strings in each line
+    :type pattern: re.Pattern
+    :return: generator of the words and their citation strings split on '.'
+    :rtype: (str, list)
+    """
+    for line in text:
+        yield pattern.sub(r'\1', line), ID_PATTERN.sub(r'\1', line).replace('/', '-').split('.')
@@ -1,18 +1,19 @@
 from Code.BuildCorpus.Bible.build import BuildBible
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 import os
-from collections import defaultdict
 
 
 def __wordextract__(content):
     """ Parse a .tab content and return lemmas
 
-    :param content: String
+    :param content: String, or iterable of lines such as an open file
     :return: List of Words
     """
-    tokens = content.split("\n")
-    for token in tokens:
-        tok = token.split("\t")
+    if isinstance(content, str):
+        content = content.split("\n")
+    for token in content:
+        tok = token.rstrip("\n").split("\t")
         if len(tok) > 3:
             yield tok[2]
 
@@ -24,15 +25,22 @@ class BuildGreek(BuildBible):
     :type folders: [str]
     :param dest: the directory in which to save the transformed corpus files
     :type dest: str
+    :param manifest: the path of the record of the source files built (Default: dest/.manifest.json)
+    :type manifest: str
     """
 
-    def __init__(self, folders, dest):
+    def __init__(self, folders, dest, manifest=None):
         self.filenames = []
         for folder in folders:
             self.filenames += glob('{}/**/*.tab'.format(folder), recursive=True)
         if not os.path.isdir(dest):
             os.makedirs(dest)
-        self.dest = dest
+        self.dest, self.split_level = dest, None
+        self.dests = {None: dest}
+        self.pattern = None
+        if manifest is None:
+            manifest = os.path.join(dest, '.manifest.json')
+        self.manifest = manifest
 
     def build_word_list(self, f):
         """
@@ -43,34 +51,91 @@ class BuildGreek(BuildBible):
         :rtype:
         """
 
-    def split_text(self):
-        """ Separates the texts contained in the .tab files into a dictionary of lists where each sublist contains the
-            line strings for each
+    def split_file(self, file, levels):
+        """ Reads the lemmas of one .tab file
 
-        :return: dictionary of the split lists of word-containing strings. Split is based on split_level.
-            The dictionary keys are the names of the split sections, e.g., corpus. book, chapter, verse
-        :rtype: {str: list}
+        :param file: the path of the file
+        :type file: str
+        :param levels: the split levels, only None for the Greek Treebank
+        :type levels: [str]
+        :return: dictionary of the words of the file, keyed by the file name
+        :rtype: {None: {str: list}}
         """
-        words = defaultdict(list)
-        for file in self.filenames:
-            with open(file) as f:
-                words[os.path.basename(file)] = list(__wordextract__(f.read()))
-        return words
+        with open(file) as f:
+            return {None: {os.path.basename(file): list(__wordextract__(f))}}
+
+    def build_file(self, file):
+        """ Writes the lemmas of one .tab file as they are read, line by line
+
+        :param file: the path of the file
+        :type file: str
+        :return: the file and the path written
+        :rtype: (str, [str])
+        """
+        path = '{}/{}.txt'.format(self.dest, os.path.basename(file))
+        with open(file) as f, open(path, mode='w') as output:
+            for index, word in enumerate(__wordextract__(f)):
+                if index:
+                    output.write(' ')
+                output.write(word)
+        return file, [path]
+
+    def build_files(self, filenames, jobs=1):
+        """ Runs build_file over files, in a process pool if jobs > 1
 
-    def build_transformed(self, cite_dict):
+        :return: generator of the build_file() result of each file, in the order of filenames
         """
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for result in executor.map(self.build_file, filenames, chunksize=4):
+                    yield result
+        else:
+            for file in filenames:
+                yield self.build_file(file)
 
-        :param cite_dict: dictionary of all the citation units as keys and their list of words as values
-        :type cite_dict: {str: list}
+    def run(self, jobs=1, incremental=False, packed=False):
+        """ Convenience function to run all functions in the class, streaming each source file to its output
+
+        Only one line of a source file is held in memory at a time. When several source files have the same name, the
+        last one is written, as with split_text(), and it is written again from the remaining one when it is removed.
+
+        :param jobs: the number of processes building files
+        :type jobs: int
+        :param incremental: only rebuild the outputs of the source files that changed (See BuildBible.run)
+        :type incremental: bool
+        :param packed: also write the packed corpus of the outputs
+        :type packed: bool
         """
-        for c, words in cite_dict.items():
-            dest_dir = '{}/{}'.format(self.dest, '/'.join(c.split('/')[:-1]))
-            if not os.path.isdir(dest_dir):
-                os.makedirs(dest_dir)
-            with open('{}/{}.txt'.format(self.dest, c), mode='w') as f:
-                f.write(' '.join(words))
-
-    def run(self):
-        """ Convenience function to run all functions in the class
+        manifest, hashes, changed, removed = self.changes(incremental, packed)
+        if changed is None:
+            return
+        previous = manifest.outputs()
+        winners = {os.path.basename(file): file for file in self.filenames}
+        names = {os.path.basename(file) for file in list(changed) + removed}
+        built = [
+            file for file in self.filenames
+            if os.path.basename(file) in names and winners[os.path.basename(file)] == file
+        ]
+        written = []
+        for file in removed:
+            manifest.forget(file)
+        # Every source of an output being rebuilt, the ones it shadows included, is recorded again
+        for file in self.filenames:
+            if os.path.basename(file) in names:
+                manifest.record(file, hashes[file], [])
+        for file, outputs in self.build_files(built, jobs):
+            manifest.record(file, hashes[file], outputs)
+            written += outputs
+        self.clean(manifest, previous, written, packed)
+
+    def packed_groups(self, paths):
+        """ Packed corpus of the output files : every file of self.dest, packed next to it
+
+        :param paths: the output files
+        :type paths: [str]
+        :return: dictionary of the files of the packed corpus, keyed by its path (See Code.utils.packed)
+        :rtype: {str: [str]}
         """
-        self.build_transformed(self.split_text())
+        if not paths:
+            return {}
+        return {self.dest.rstrip('/') + '.packed': glob('{}/**/*.txt'.format(self.dest), recursive=True)}
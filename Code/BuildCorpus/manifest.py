@@ -0,0 +1,87 @@
+from hashlib import sha1
+from os.path import isfile
+from os import replace
+import json
+
+
+def file_hash(path):
+    """ SHA1 of the content of a file
+
+    :param path: Path of the file
+    :rtype: str
+    """
+    digest = sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest(object):
+    """ Record of the hash of each source file of a corpus build and of the output files it produced
+
+    The record is only reused if it was saved with the same @settings, i.e. if the build would produce the same
+    outputs from the same sources.
+
+    :param path: Path of the JSON file
+    :param settings: Anything JSON-serialisable that changes the outputs of the build (patterns, destinations, version
+        of the builder...)
+    """
+    def __init__(self, path, settings=None):
+        self.path = path
+        self.settings = settings
+        self.sources = {}
+        if isfile(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved["settings"] == json.loads(json.dumps(settings)):
+                self.sources = saved["sources"]
+
+    def changed(self, hashes):
+        """ Sources which are new, whose content changed or one of whose outputs is missing
+
+        :param hashes: Dictionary of the current hash of each source
+        :rtype: [str]
+        """
+        return [
+            source for source, digest in hashes.items()
+            if source not in self.sources or self.sources[source]["hash"] != digest
+            or not all(isfile(output) for output in self.sources[source]["outputs"])
+        ]
+
+    def removed(self, hashes):
+        """ Sources which were built but are gone
+
+        :param hashes: Dictionary of the current hash of each source
+        :rtype: [str]
+        """
+        return [source for source in self.sources if source not in hashes]
+
+    def outputs(self, sources=None):
+        """ Set of the outputs recorded for some sources
+
+        :param sources: Sources to look up (Default: all)
+        :rtype: set
+        """
+        if sources is None:
+            sources = self.sources.keys()
+        return {output for source in sources if source in self.sources for output in self.sources[source]["outputs"]}
+
+    def record(self, source, digest, outputs):
+        """ Record the outputs a source was built into
+
+        :param source: Path of the source
+        :param digest: Hash of the source
+        :param outputs: Paths of the outputs
+        """
+        self.sources[source] = {"hash": digest, "outputs": sorted(outputs)}
+
+    def forget(self, source):
+        """ Remove a source from the record """
+        self.sources.pop(source, None)
+
+    def save(self):
+        """ Atomically write the manifest """
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"settings": self.settings, "sources": self.sources}, f, indent=2, sort_keys=True)
+        replace(self.path + ".tmp", self.path)
@@ -0,0 +1,204 @@
+from Code.WtoVec.corpus import StreamingCorpus, corpus_files
+from Code.utils.matrix import SparseSignificanceMatrix
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
+import numpy as np
+
+
+def count_files(files, vocabulary, window=5, buffer_size=10000000):
+    """ Count the co-occurrences of the words of some files, one document per file
+
+    Two tokens co-occur when at most @window tokens apart inside a document. Tokens are lowercased, those out of
+    @vocabulary are skipped but keep their position, so that they still separate the words around them. Pairs are buffered and summed into
+    the sparse counts every @buffer_size pairs.
+
+    :param files: List of paths of the files
+    :param vocabulary: Dictionary of lowercased word -> id
+    :param window: Maximum distance between two co-occurring tokens
+    :param buffer_size: Number of pairs kept before being summed
+    :return: Symmetric (len(vocabulary), len(vocabulary)) matrix of counts
+    :rtype: scipy.sparse.csr_matrix
+    """
+    shape = (len(vocabulary), len(vocabulary))
+    counts = sparse.csr_matrix(shape, dtype=np.int64)
+    lefts, rights, buffered = [], [], 0
+    for file in files:
+        with open(file) as f:
+            ids = np.array([vocabulary.get(token.lower(), -1) for token in f.read().split()], dtype=np.int64)
+        for distance in range(1, window + 1):
+            left, right = ids[:-distance], ids[distance:]
+            known = (left >= 0) & (right >= 0)
+            lefts.append(left[known])
+            rights.append(right[known])
+            buffered += len(lefts[-1])
+            if buffered >= buffer_size:
+                counts = counts + pairs(lefts, rights, shape)
+                lefts, rights, buffered = [], [], 0
+    counts = counts + pairs(lefts, rights, shape)
+    # A word co-occurring with itself is only counted once
+    return counts + counts.T - sparse.diags(counts.diagonal(), 0, dtype=np.int64)
+
+
+def pairs(lefts, rights, shape):
+    """ Sum pairs of word ids into a sparse matrix of counts
+
+    :param lefts: List of arrays of the ids of the first words
+    :param rights: List of arrays of the ids of the second words
+    :param shape: Shape of the matrix
+    :rtype: scipy.sparse.csr_matrix
+    """
+    if not lefts:
+        return sparse.csr_matrix(shape, dtype=np.int64)
+    left, right = np.concatenate(lefts), np.concatenate(rights)
+    return sparse.coo_matrix((np.ones(len(left), dtype=np.int64), (left, right)), shape=shape).tocsr()
+
+
+def cells(counts):
+    """ Observed count, row total, column total and grand total of each stored cell of a matrix of counts
+
+    :param counts: Matrix of counts
+    :type counts: scipy.sparse.csr_matrix
+    :return: (observed, row totals, column totals, grand total), the first three aligned on counts.data
+    """
+    counts = counts.tocsr()
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    row_totals = np.asarray(counts.sum(axis=1), dtype=np.float64).ravel()
+    column_totals = np.asarray(counts.sum(axis=0), dtype=np.float64).ravel()
+    return (
+        counts.data.astype(np.float64), row_totals[rows], column_totals[counts.indices],
+        float(row_totals.sum())
+    )
+
+
+def with_data(counts, data):
+    """ Matrix with the sparsity of @counts and the values @data, zero values being dropped
+
+    :rtype: scipy.sparse.csr_matrix
+    """
+    counts = counts.tocsr()
+    matrix = sparse.csr_matrix((data, counts.indices.copy(), counts.indptr.copy()), shape=counts.shape)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def log_likelihood(counts):
+    """ Dunning's log-likelihood ratio (G2) of each co-occurrence, kept only for words attracting each other
+
+    Cells observed less often than expected get 0, so that the matrix keeps the sparsity of the counts.
+
+    :param counts: Matrix of counts
+    :type counts: scipy.sparse.csr_matrix
+    :rtype: scipy.sparse.csr_matrix
+    """
+    o11, rows, columns, total = cells(counts)
+    observed = [o11, rows - o11, columns - o11, total - rows - columns + o11]
+    expected = [
+        rows * columns / total, rows * (total - columns) / total,
+        (total - rows) * columns / total, (total - rows) * (total - columns) / total
+    ]
+    ll = np.zeros(len(o11))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for o, e in zip(observed, expected):
+            ll += np.where(o > 0, o * np.log(o / e), 0)
+    return with_data(counts, np.where(o11 > expected[0], 2 * ll, 0))
+
+
+def ppmi(counts):
+    """ Positive pointwise mutual information of each co-occurrence, max(0, log(P(w1, w2) / (P(w1) P(w2))))
+
+    :param counts: Matrix of counts
+    :type counts: scipy.sparse.csr_matrix
+    :rtype: scipy.sparse.csr_matrix
+    """
+    o11, rows, columns, total = cells(counts)
+    return with_data(counts, np.maximum(np.log(o11 * total / (rows * columns)), 0))
+
+
+MEASURES = {"ll": log_likelihood, "ppmi": ppmi}
+
+
+class Cooccurrences(object):
+    """ Windowed co-occurrence counts of a corpus, read the same way W2VModel reads it
+
+    Files are counted by chunks of @chunk_size in a process pool and the sparse counts of the chunks are summed. Words
+    are lowercased, as ComputeDistance and Evaluator look them up, and their ids follow the index : most frequent words
+    first, ties in alphabetical order.
+
+    :param directory: Path (or list of paths) of the corpus
+    :param window: Maximum distance between two co-occurring tokens
+    :param min_count: Minimum number of occurrences of a word to be counted
+    :param statistics: Already computed statistics for this corpus
+    :type statistics: Code.WtoVec.corpus.CorpusStatistics
+    """
+    def __init__(self, directory, window=5, min_count=1, statistics=None):
+        self.directory = directory
+        self.window = window
+        self.min_count = min_count
+        self.files = sorted(corpus_files(directory))
+        self.corpus = StreamingCorpus(self.files, directory, statistics=statistics)
+        self.__index__ = None
+        self.__counts__ = None
+
+    @property
+    def index(self):
+        """ Lowercased words counted, in id order
+
+        :rtype: [str]
+        """
+        if self.__index__ is None:
+            occurences = {}
+            for word, count in self.corpus.occurences.items():
+                occurences[word.lower()] = occurences.get(word.lower(), 0) + count
+            self.__index__ = sorted(
+                [word for word, count in occurences.items() if count >= self.min_count],
+                key=lambda word: (-occurences[word], word)
+            )
+        return self.__index__
+
+    @property
+    def vocabulary(self):
+        """ Dictionary of word -> id """
+        return {word: i for i, word in enumerate(self.index)}
+
+    def count(self, jobs=1, chunk_size=16):
+        """ Count the co-occurrences of the corpus
+
+        :param jobs: Number of processes counting chunks of files at once
+        :param chunk_size: Number of files counted by one task
+        :return: Symmetric matrix of counts, in the order of the index
+        :rtype: scipy.sparse.csr_matrix
+        """
+        vocabulary = self.vocabulary
+        chunks = [self.files[start:start+chunk_size] for start in range(0, len(self.files), chunk_size)]
+        counts = sparse.csr_matrix((len(vocabulary), len(vocabulary)), dtype=np.int64)
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(count_files, chunk, vocabulary, self.window) for chunk in chunks]
+                for future in futures:
+                    counts = counts + future.result()
+        else:
+            for chunk in chunks:
+                counts = counts + count_files(chunk, vocabulary, self.window)
+        self.__counts__ = counts
+        return counts
+
+    @property
+    def counts(self):
+        """ Matrix of counts, counted in this process on first access
+
+        :rtype: scipy.sparse.csr_matrix
+        """
+        if self.__counts__ is None:
+            self.count()
+        return self.__counts__
+
+    def significance(self, measure="ll"):
+        """ Significance of the co-occurrences
+
+        :param measure: "ll" for log-likelihood or "ppmi" for positive pointwise mutual information
+        :return: Matrix usable by ComputeDistance and Evaluator
+        :rtype: SparseSignificanceMatrix
+        """
+        if measure not in MEASURES:
+            raise ValueError("Unknown measure {}, expected one of {}".format(measure, ", ".join(sorted(MEASURES))))
+        return SparseSignificanceMatrix(MEASURES[measure](self.counts), self.index)
@@ -1,28 +1,46 @@
 from Code.BuildCorpus.Bible.test_grouping import CreateTestGroups
 from Code.WtoVec import W2VModel
 import math
+import random
 from statistics import mean
 from os.path import basename, dirname
 from pandas import DataFrame, read_pickle
 from Code.utils import pandas_most_sim
+from Code.utils.matrix import SignificanceMatrix
 from collections import namedtuple
+import numpy as np
 
 
 class Evaluator(object):
     """ Evaluate a word2vec model
 
-    :param w2vec: Code.WtoVec.W2VModel
-    :param test_data_path: Path to the tsv file
-    :type test_data_path: str
+    With a similarity matrix, the neighbours of every word of the testing groups are computed once, up front.
+
+    :param w2vec: Code.WtoVec.W2VModel or a similarity matrix, as a DataFrame, a (memory-mapped) SignificanceMatrix or
+        a SparseSignificanceMatrix
+    :param test_data_path: Path to the tsv file or list of testing groups
+    :type test_data_path: str or [([str], [str])]
     """
     def __init__(self, w2vec, test_data_path):
         self.w2vec = w2vec
         if type(self.w2vec) is DataFrame:
-            self.w2vec.most_similar = self.pandas_most_sim
-            self.w2vec.similarity = self.pandas_similarity
+            self.w2vec = SignificanceMatrix(np.ascontiguousarray(self.w2vec.values), self.w2vec.index)
+        if isinstance(self.w2vec, SignificanceMatrix):
             self.occ_dict = read_pickle('data/original/SBLGNT_lem_dict.pickle')
-        self.test_data = CreateTestGroups.load_TSV(test_data_path)
+        if isinstance(test_data_path, list):
+            self.test_data = test_data_path
+        else:
+            self.test_data = CreateTestGroups.load_TSV(test_data_path)
         self.top_score = {}
+        self.topn = 5
+        self.neighbours = {}
+        if isinstance(self.w2vec, SignificanceMatrix):
+            self.neighbours = self.w2vec.neighbours(sorted({
+                word
+                for (good_words, bad_words) in self.test_data
+                for word in good_words + bad_words
+                if word.lower() in self.w2vec
+            }), n=self.topn)
 
     def single_score(self, fitting, alien):
         """ Compute the score for fitting and alien words in a row
@@ -39,6 +57,16 @@ class Evaluator(object):
             outlier.append(self.gap_score(alien_single, fitting))
         return good, outlier
 
+    def most_similar(self, word, n=5):
+        """ Compute the @n similar words to @word, from the neighbours computed up front when there are enough of them """
+        if n <= self.topn and word in self.neighbours:
+            return self.neighbours[word][:n]
+        return self.w2vec.most_similar(word, n=n)
+
+    def doesnt_match(self, words):
+        """ In a list of words, tell which one is not fitting in the group"""
+        return self.w2vec.doesnt_match(words)
+
     def gap_score(self, source, targets):
         """ Compute the GAP score for a word
 
@@ -47,13 +75,30 @@ class Evaluator(object):
         :return:
         """
         if source not in self.top_score:
-            self.top_score[source] = mean([score for _, score in self.w2vec.most_similar(source)])
+            self.top_score[source] = mean([score for _, score in self.most_similar(source)])
         score = [
             math.pow(self.top_score[source] - max([self.w2vec.similarity(source, target), 0]), 1)
             for target in targets
         ]
         return sum(score) / len(score)
 
+    def mean_difference(self):
+        """ Compute the mean over the testing groups of the Mean Gap Score Difference, ignoring failing rows
+
+        :return: Mean of the differences, NaN if every row fails
+        :rtype: float
+        """
+        differences = []
+        for (good_words, bad_words) in self.test_data:
+            try:
+                good, outlier = self.single_score(good_words, bad_words)
+            except KeyError:
+                continue
+            differences.append(mean(outlier) - mean(good))
+        if not differences:
+            return float("nan")
+        return mean(differences)
+
     def score(self, filename="score.tsv", nomatch=False):
         """ Compute scores for the text
 
@@ -73,7 +118,7 @@ class Evaluator(object):
                 mgood, moutlier = mean(good), mean(outlier)
                 if type(self.w2vec) is W2VModel:
                     occs = [str(self.w2vec.occurences[w]) for w in good_words+bad_words]
-                    doesnotmatch = self.w2vec.doesnt_match(good_words + bad_words)
+                    doesnotmatch = self.doesnt_match(good_words + bad_words)
                     doesnotmatch_score = 0
                     if doesnotmatch in bad_words:
                         doesnotmatch_score = 1
@@ -87,7 +132,7 @@ class Evaluator(object):
                         [str(moutlier - mgood)] + good_words + bad_words +
                         [doesnotmatch, str(doesnotmatch_score)] +
                         occs +
-                        [" ; ".join([str(s) for s in self.w2vec.most_similar(w, n=1)[0]]) for w in good_words+bad_words]
+                        [" ; ".join([str(s) for s in self.most_similar(w, n=1)[0]]) for w in good_words+bad_words]
                     )
                 )
 
@@ -109,6 +154,9 @@ class Evaluator(object):
             )
             f.write("\n".join(lines))
 
+        if type(self.w2vec) is W2VModel:
+            self.w2vec.save_neighbours()
+
     def pandas_most_sim(self, target, n=5):
         """ finds the most similar candidate words to a target word
 
@@ -119,10 +167,7 @@ class Evaluator(object):
         :return: the n_candidate most similar words
         :rtype: list
         """
-        target = target.lower()
-        v = list(self.w2vec.ix[target].sort_values(ascending=False).head(n + 1))[1:]
-        k = list(self.w2vec.ix[target].sort_values(ascending=False).head(n + 1).index)[1:]
-        return [x for x in zip(k, v)]
+        return self.most_similar(target, n=n)
 
     def pandas_similarity(self, w1, w2):
         """ finds the most similar candidate words to a target word
@@ -134,38 +179,96 @@ class Evaluator(object):
         :return: the similarity score of the two words
         :rtype: list
         """
-        return self.w2vec.ix[w1.lower()][w2.lower()]
+        return self.w2vec.similarity(w1, w2)
+
+
+class EarlyStopping(object):
+    """ Stop a W2VModel training once the Mean Gap Score Difference on held-out testing groups plateaus
+
+    The model is evaluated after each chunk of epochs and the curve of (epochs, score) is kept in self.curve. An
+    evaluation where no group can be scored counts as no improvement.
+
+    The held-out groups must not be the ones the trained model is then scored on, e.g. a testing file generated with
+    another seed (See CreateTestGroups.generate), otherwise the stopping point is tuned on the reported evaluation.
+
+    :param test_data_path: Path to the tsv file of the held-out testing groups
+    :param chunk: Number of epochs between two evaluations
+    :param patience: Number of evaluations without improvement before stopping
+    :param min_delta: Minimal increase of the score counted as an improvement
+    """
+    def __init__(self, test_data_path, chunk=50, patience=3, min_delta=0.001):
+        self.test_data = CreateTestGroups.load_TSV(test_data_path)
+        self.settings = dict(test_data_path=test_data_path, chunk=chunk, patience=patience, min_delta=min_delta)
+        self.chunk = chunk
+        self.patience = patience
+        self.min_delta = min_delta
+        self.curve = []
+
+    def __call__(self, w2vec, epochs):
+        """ Evaluate the model after a chunk of epochs
+
+        :param w2vec: Model in training
+        :type w2vec: W2VModel
+        :param epochs: Number of epochs done
+        :return: Whether the training should stop
+        :rtype: bool
+        """
+        w2vec.model.clear_sims()  # Normalised vectors are cached by gensim
+        self.curve.append((epochs, Evaluator(w2vec, self.test_data).mean_difference()))
+        if len(self.curve) <= self.patience:
+            return False
+        scores = [-math.inf if math.isnan(score) else score for _, score in self.curve]
+        before = max(scores[:-self.patience])
+        return max(scores[-self.patience:]) < before + self.min_delta
+
+    def write(self, path):
+        """ Write the curve of scores
+
+        :param path: Path of the tsv file
+        """
+        with open(path, "w") as f:
+            f.write("Epochs\tMean Gap Score Difference\n")
+            f.write("\n".join("{}\t{}".format(epochs, score) for epochs, score in self.curve))
 
 
 class Gephi:
     """ Generates a network of word in the context of the W2Vec graph
 
+    Nodes are numbered once in self.node_ids and the similarities between them are computed as matrix products over
+    their unit-normalised vectors, @batch_size source nodes at a time, so that edges are written as they are computed.
+
     :param model: Path to the model file
     :param domain: Path to the domain text file
     :param topn: Number of top nodes needed to be taken
+    :param vectors: Use the exported, memory-mapped vectors of the model (See W2VModel.export)
+    :param edges_topn: Only keep the edges towards the @edges_topn most similar nodes of each node (Default: all)
+    :param threshold: Only keep the edges whose similarity is at least @threshold (Default: all)
+    :param batch_size: Number of source nodes whose edges are computed at once
     """
 
-    def __init__(self, model, domain, topn=5):
+    def __init__(self, model, domain, topn=5, vectors=False, edges_topn=None, threshold=None, batch_size=256):
         self.model = W2VModel(basename(model).replace(".model", ""), dirname(model))
-        self.model.load()
+        self.model.load(vectors=vectors)
 
         with open(domain) as f:
             self.input = f.read().split("\n")
 
         # Sanitize data by removing unknown words
         sanitized = []
-        for word in set(self.input):
-            try:
-                _ = self.model.most_similar(word, 1)
+        for word in dict.fromkeys(self.input):
+            if word in self.model.word2index:
                 sanitized.append(word)
-            except (IndexError, KeyError):
+            else:
                 print("{} is not in the vocabulary".format(word))
         self.input = [] + sanitized
 
         self.additional_nodes = []
         self.nodes = []
-        self.edges = []
+        self.node_ids = {}
         self.topn = topn
+        self.edges_topn = edges_topn
+        self.threshold = threshold
+        self.batch_size = batch_size
 
     def write(self, path):
         """ Write the nodes and edges in Path
@@ -176,42 +279,51 @@ class Gephi:
 
         self.find_nodes()
         self.nodes = self.input + self.additional_nodes
-        self.build_edges()
+        self.node_ids = {node: index for index, node in enumerate(self.nodes)}
+        inputs = set(self.input)
         with open(path+".nodes.tsv", "w") as f:
-            f.write("\n".join(
-                ["id\tlabel\ttype"] + [
-                    "{}\t{}\t{}".format(
-                        str(self.nodes.index(node)), node, str(int(node in self.input))
-                    ) for node in self.nodes
-                ]
-            ))
+            f.write("id\tlabel\ttype")
+            for node in self.nodes:
+                f.write("\n{}\t{}\t{}".format(self.node_ids[node], node, int(node in inputs)))
 
         with open(path+".edges.tsv", "w") as f:
-            f.write("\n".join(
-                ["source\ttarget\tweight"] + [
-                    "\t".join(edge) for edge in self.edges
-                ]
-            ))
+            f.write("source\ttarget\tweight")
+            for edge in self.build_edges():
+                f.write("\n" + "\t".join(edge))
+        self.model.save_neighbours()
 
     def find_nodes(self):
         """ Build nodes in the document
         """
+        known = set(self.input)
+        additional_nodes = {}
         for word in self.input:
-            self.additional_nodes += [
-                new_word
-                for new_word, *_ in self.model.most_similar(word, n=self.topn)
-                if new_word not in self.additional_nodes + self.input
-            ]
-        self.additional_nodes = list(set(self.additional_nodes))
+            for new_word, *_ in self.model.most_similar(word, n=self.topn):
+                if new_word not in known:
+                    additional_nodes[new_word] = True
+        self.additional_nodes = list(additional_nodes)
 
     def build_edges(self):
-        """ Build the list of edges
+        """ Generate the edges between the nodes, pruned to the top neighbours of each node and/or to a threshold
+
+        :return: Generator of [source id, target id, similarity]
         """
-        for source in self.nodes:
-            for target in [x for x in self.nodes if x != source]:
-                source_index, target_index = self.nodes.index(source), self.nodes.index(target)
-                self.edges.append([str(source_index), str(target_index), str(self.model.similarity(source, target))])
-        return self.edges
+        vectors = self.model.vectors[[self.model.word2index[node] for node in self.nodes]]
+        for start in range(0, len(self.nodes), self.batch_size):
+            sources = np.arange(start, min(start + self.batch_size, len(self.nodes)))
+            similarities = np.dot(vectors[sources], vectors.T)
+            keep = np.ones(similarities.shape, dtype=bool)
+            keep[np.arange(len(sources)), sources] = False
+            if self.threshold is not None:
+                keep &= similarities >= self.threshold
+            if self.edges_topn is not None and self.edges_topn < len(self.nodes) - 1:
+                ranked = np.where(keep, similarities, -np.inf)
+                best = np.argpartition(-ranked, self.edges_topn - 1, axis=1)[:, :self.edges_topn]
+                selected = np.zeros(similarities.shape, dtype=bool)
+                selected[np.arange(len(sources))[:, None], best] = True
+                keep &= selected
+            for row, target in zip(*np.nonzero(keep)):
+                yield [str(sources[row]), str(target), str(similarities[row, target])]
 
 if __name__ == "__main__":
     from Code.WtoVec import W2VModel
@@ -0,0 +1,118 @@
+import numpy as np
+import math
+from statistics import mean
+from Code.Evaluate import Evaluator
+
+
+def top_k(similarities, k, exclude=None):
+    """ Select the @k highest similarities of each row, best first
+
+    :param similarities: Matrix of similarities, one row per query
+    :type similarities: numpy.ndarray
+    :param k: Number of neighbours to keep
+    :param exclude: Column to ignore for each row (e.g. the query word itself)
+    :type exclude: [int]
+    :return: Indexes and similarities of the neighbours, both of shape (rows, k)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    if exclude is not None:
+        similarities[np.arange(len(exclude)), exclude] = -np.inf
+    k = min(k, similarities.shape[1])
+    lines = np.arange(similarities.shape[0])[:, None]
+    indexes = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    selected = similarities[lines, indexes]
+    order = np.argsort(-selected, axis=1, kind="mergesort")
+    return indexes[lines, order], selected[lines, order]
+
+
+class BatchEvaluator(Evaluator):
+    """ Evaluate a word2vec model with all neighbours computed up front
+
+    Every distinct word of the testing groups is looked up once : its @topn neighbours come from the neighbour cache of
+    the model or from a single matrix product against the unit-normalised vectors, and the similarities inside a group
+    are computed as one small dense block. The output of score() is the same as the one of Evaluator.
+
+    :param w2vec: Code.WtoVec.W2VModel
+    :param test_data_path: Path to the tsv file or list of testing groups
+    :type test_data_path: str or [([str], [str])]
+    :param topn: Number of neighbours computed for each word
+    :param batch_size: Number of words whose similarities to the whole vocabulary are computed at once
+    """
+    def __init__(self, w2vec, test_data_path, topn=5, batch_size=256):
+        super(BatchEvaluator, self).__init__(w2vec, test_data_path)
+        self.topn = topn
+        self.neighbours = {}
+        self.compute_neighbours(batch_size)
+
+    def compute_neighbours(self, batch_size=256):
+        """ Compute the neighbours and the top score of every known word of the testing groups
+
+        :param batch_size: Number of words whose similarities to the whole vocabulary are computed at once
+        """
+        vectors, index2word, word2index = self.w2vec.vectors, self.w2vec.index2word, self.w2vec.word2index
+        cache = self.w2vec.neighbours
+        words = sorted({
+            word
+            for (good_words, bad_words) in self.test_data
+            for word in good_words + bad_words
+            if word in word2index
+        })
+        missing = []
+        for word in words:
+            cached = cache.get(word, self.topn) if cache is not None else None
+            if cached is None:
+                missing.append(word)
+            else:
+                self.neighbours[word] = cached
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start+batch_size]
+            rows = [word2index[word] for word in batch]
+            indexes, similarities = top_k(np.dot(vectors[rows], vectors.T), self.topn, exclude=rows)
+            for word, neighbours, scores in zip(batch, indexes, similarities):
+                self.neighbours[word] = [(index2word[i], float(score)) for i, score in zip(neighbours, scores)]
+                if cache is not None:
+                    cache.put(word, self.neighbours[word])
+        for word in words:
+            self.top_score[word] = mean([score for _, score in self.neighbours[word]])
+
+    def most_similar(self, word, n=5):
+        """ Compute the @n similar words to @word """
+        if n > self.topn or word not in self.neighbours:
+            return super(BatchEvaluator, self).most_similar(word, n=n)
+        return self.neighbours[word][:n]
+
+    def doesnt_match(self, words):
+        """ In a list of words, tell which one is not fitting in the group"""
+        vectors = self.w2vec.vectors[[self.w2vec.word2index[word] for word in words]]
+        center = vectors.mean(axis=0)
+        center /= np.sqrt(np.dot(center, center))
+        return sorted(zip(np.dot(vectors, center), words))[0][1]
+
+    def single_score(self, fitting, alien):
+        """ Compute the score for fitting and alien words in a row
+
+        :param fitting: Fitting words
+        :param alien: Alien Words
+        :return: List of scores
+        """
+        words = fitting + alien
+        rows = [self.w2vec.word2index[word] for word in words]
+        block = np.dot(self.w2vec.vectors[rows], self.w2vec.vectors[rows].T)
+        good, outlier = [], []
+        for i, fitting_single in enumerate(fitting):
+            others = [j for j, w in enumerate(fitting) if w != fitting_single]
+            good.append(self.block_gap_score(fitting_single, block[i, others]))
+        for i, alien_single in enumerate(alien, start=len(fitting)):
+            outlier.append(self.block_gap_score(alien_single, block[i, :len(fitting)]))
+        return good, outlier
+
+    def block_gap_score(self, source, similarities):
+        """ Compute the GAP score for a word from its similarities with its targets
+
+        :param source: A single word for which we compute Gap score
+        :param similarities: Similarities of the word with its targets
+        :type similarities: numpy.ndarray
+        :return:
+        """
+        score = [math.pow(self.top_score[source] - max([similarity, 0]), 1) for similarity in similarities]
+        return sum(score) / len(score)
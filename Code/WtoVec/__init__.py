@@ -1,8 +1,16 @@
 from gensim.models.word2vec import Word2Vec, LineSentence
-from glob import glob
-from os.path import join, isdir
-from os import mkdir
-from collections import Counter
+from os.path import join, isfile, getmtime, getsize
+from os import makedirs, remove, replace
+from hashlib import sha1
+from time import time
+import json
+import pickle
+from Code.WtoVec.corpus import StreamingCorpus, PackedCorpus, CorpusStatistics, corpus_files
+from Code.WtoVec.cache import NeighbourCache
+from Code.WtoVec.vectors import NormalisedVectors
+from Code.WtoVec.index import InvertedFileIndex
+from Code.utils.packed import packed_paths
+import numpy as np
 
 
 class W2VModel(object):
@@ -15,8 +23,15 @@ class W2VModel(object):
     :param preload: Preload a pre-trained model
     :param epochs: Number of epochs
     :param additional_words: Set of words from other models
+    :param streaming: Read the corpus lazily through a StreamingCorpus instead of keeping every file in memory
+    :param early_stopping: Criterion called after each chunk of epochs to stop training (See Code.Evaluate.EarlyStopping)
+    :param cache_size: Number of words whose neighbours are cached on disk for the saved model (0 to disable)
+    :param probe: Number of lists of the approximate nearest-neighbour index scanned by most_similar, None for an exact
+        scan (See build_index)
+    :param packed: Read the corpus from the packed corpora written next to it by the corpus builders (See packed_input)
     """
-    def __init__(self, name, directory, epochs=500, parameters=None, output_dir="models", preload=None, additional_words=None):
+    def __init__(self, name, directory, epochs=500, parameters=None, output_dir="models", preload=None, additional_words=None,
+                 streaming=False, early_stopping=None, cache_size=10000, probe=None, packed=False):
         self.name = name
         self.directory = directory
         self.parameters = parameters
@@ -24,8 +39,8 @@ class W2VModel(object):
         self.parameters = dict()
         if parameters is not None:
             self.parameters.update(parameters)
-        if not isdir(output_dir):
-            mkdir(output_dir)
+        # Jobs of train.schedule create the same output directory concurrently
+        makedirs(output_dir, exist_ok=True)
         self.output_dir = output_dir
         self.preload = preload
         self.__model__ = None
@@ -33,7 +48,17 @@ class W2VModel(object):
         self.__sentences__ = None
         self.additional_words = additional_words
         self.__words__ = None
-        self.__occurences__ = None
+        self.__statistics__ = None
+        self.__fingerprint__ = None
+        self.__word2index__ = None
+        self.__neighbours__ = None
+        self.__index__ = None
+        self.__version__ = None
+        self.streaming = streaming
+        self.early_stopping = early_stopping
+        self.cache_size = cache_size
+        self.probe = probe
+        self.packed = packed
 
     @property
     def model(self):
@@ -48,15 +73,8 @@ class W2VModel(object):
     def texts(self):
         """ Generator yield the list of files that are supposed to form the corpus
         """
-        if isinstance(self.directory, list):
-            for directory in self.directory:
-                for file in glob(join(directory, "**/*.txt"), recursive=True):
-                    yield file
-        elif self.directory.endswith(".txt"):
-            yield self.directory
-        else:
-            for x in glob(join(self.directory, "**/*.txt"), recursive=True):
-                yield x
+        for file in corpus_files(self.directory):
+            yield file
 
     @property
     def files(self):
@@ -69,12 +87,28 @@ class W2VModel(object):
                     self.__files__.append(f.read())
         return self.__files__
 
+    @property
+    def packed_input(self):
+        """ Path (or list of paths) of the packed corpora of the corpus : a/b.packed for the directory a/b or the file
+        a/b.txt
+        """
+        paths = [
+            (directory[:-len(".txt")] if directory.endswith(".txt") else directory.rstrip("/")) + ".packed"
+            for directory in (self.directory if isinstance(self.directory, list) else [self.directory])
+        ]
+        return paths if isinstance(self.directory, list) else paths[0]
+
     @property
     def sentences(self):
-        """ List of sentences
+        """ List of sentences (or a StreamingCorpus when streaming, a PackedCorpus when packed)
         """
         if self.__sentences__ is None:
-            self.__sentences__ = [s.split() for s in self.files]
+            if self.packed:
+                self.__sentences__ = PackedCorpus(self.packed_input, self.directory)
+            elif self.streaming:
+                self.__sentences__ = StreamingCorpus(self.texts, self.directory, statistics=self.__statistics__)
+            else:
+                self.__sentences__ = [s.split() for s in self.files]
         return self.__sentences__
 
     @property
@@ -82,7 +116,7 @@ class W2VModel(object):
         """ Vocabulary (Set of words)
         """
         if self.__words__ is None:
-            self.__words__ = [w for s in self.files for w in s.split()]
+            self.__words__ = list(self.occurences.keys())
             if self.additional_words:
                 self.__words__ += self.additional_words
             self.__words__ = list(set(self.__words__))
@@ -93,25 +127,348 @@ class W2VModel(object):
         """ Number of unique words """
         return len(self.words)
 
+    @property
+    def statistics(self):
+        """ Statistics of the corpus, computed in one pass and saved next to the model
+
+        Saved statistics are reused as long as the corpus path and the modification times of its files did not change,
+        so that evaluating a loaded model does not need to read the corpus.
+
+        :rtype: CorpusStatistics
+        """
+        if self.__statistics__ is None and self.packed:
+            self.__statistics__ = self.sentences.statistics
+        if self.__statistics__ is None:
+            texts = list(self.texts)
+            if isfile(self.statistics_output):
+                statistics = CorpusStatistics.load(self.statistics_output)
+                if statistics.matches(self.directory, texts):
+                    self.__statistics__ = statistics
+            if self.__statistics__ is None:
+                if self.streaming:
+                    statistics = self.sentences.statistics
+                else:
+                    statistics = CorpusStatistics.from_documents(self.directory, texts, self.files)
+                statistics.save(self.statistics_output)
+                self.__statistics__ = statistics
+        return self.__statistics__
+
+    @statistics.setter
+    def statistics(self, statistics):
+        """ Share statistics already computed for the same corpus
+
+        :type statistics: CorpusStatistics
+        """
+        self.__statistics__ = statistics
+
     @property
     def output(self):
         """ Name of the output model """
         return join(self.output_dir, self.name+".model")
 
-    def train(self):
-        """ Training method """
+    @property
+    def fingerprint_output(self):
+        """ Name of the output fingerprint """
+        return join(self.output_dir, self.name+".fingerprint.json")
+
+    @property
+    def corpus_hashes(self):
+        """ Dictionary of the SHA1 of each file the model is trained from : the files of the corpus, or the vocabulary,
+        tokens and offsets of its packed corpora when packed
+        """
+        hashes = {}
+        if self.packed:
+            inputs = self.packed_input if isinstance(self.packed_input, list) else [self.packed_input]
+            texts = [path for packed in inputs for path in packed_paths(packed)]
+        else:
+            texts = self.texts
+        for text in texts:
+            digest = sha1()
+            with open(text, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            hashes[text] = digest.hexdigest()
+        return hashes
+
+    @property
+    def fingerprint(self):
+        """ Fingerprint of everything the trained model depends on : parameters, epochs, corpus content, corpus mode,
+        total_examples and the fingerprint of the preloaded model. The number of workers is left out as it does not
+        change the model.
+        """
+        if self.__fingerprint__ is None:
+            self.__fingerprint__ = sha1(json.dumps({
+                "parameters": {key: value for key, value in self.parameters.items() if key != "workers"},
+                "epochs": self.epochs,
+                "mode": "packed" if self.packed else "streaming" if self.streaming else "list",
+                "total_examples": self.count,
+                "corpus": self.corpus_hashes,
+                "preload": self.preload.fingerprint if self.preload is not None else None,
+                "early_stopping": self.early_stopping.settings if self.early_stopping is not None else None
+            }, sort_keys=True).encode()).hexdigest()
+        return self.__fingerprint__
+
+    @property
+    def saved_fingerprint(self):
+        """ Fingerprint of the inputs of the model saved at self.output, None if unknown """
+        if not isfile(self.fingerprint_output):
+            return None
+        with open(self.fingerprint_output) as f:
+            return json.load(f)["fingerprint"]
+
+    def is_up_to_date(self):
+        """ Check that the saved model was trained with the current inputs
+
+        :rtype: bool
+        """
+        return isfile(self.output) and self.saved_fingerprint == self.fingerprint
+
+    def write_fingerprint(self):
+        """ Record the fingerprint of the inputs of the saved model """
+        with open(self.fingerprint_output, "w") as f:
+            json.dump({
+                "fingerprint": self.fingerprint,
+                "name": self.name,
+                "directory": self.directory,
+                "parameters": self.parameters,
+                "epochs": self.epochs,
+                "preload": self.preload.name if self.preload is not None else None
+            }, f, indent=2)
+
+    @property
+    def statistics_output(self):
+        """ Name of the output corpus statistics """
+        return join(self.output_dir, self.name+".stats.pickle")
+
+    @property
+    def curve_output(self):
+        """ Name of the output early stopping curve """
+        return join(self.output_dir, self.name+".curve.tsv")
+
+    @property
+    def checkpoint_output(self):
+        """ Name of the output training checkpoint """
+        return join(self.output_dir, self.name+".checkpoint.pickle")
+
+    def checkpoint(self, epochs):
+        """ Atomically save the model being trained with the number of epochs already done
+
+        :param epochs: Number of epochs done
+        """
+        curve = self.early_stopping.curve if self.early_stopping is not None else None
+        with open(self.checkpoint_output + ".tmp", "wb") as f:
+            pickle.dump(
+                {"fingerprint": self.fingerprint, "epochs": epochs, "model": self.model, "curve": curve}, f, protocol=2
+            )
+        replace(self.checkpoint_output + ".tmp", self.checkpoint_output)
+
+    def resume(self):
+        """ Load the latest checkpoint if it was made with the current inputs
+
+        :return: Number of epochs already done
+        :rtype: int
+        """
+        if not isfile(self.checkpoint_output):
+            return 0
+        with open(self.checkpoint_output, "rb") as f:
+            checkpoint = pickle.load(f)
+        if checkpoint["fingerprint"] != self.fingerprint:
+            print("{} has a checkpoint for other inputs, starting over".format(self.name))
+            return 0
+        self.__model__ = checkpoint["model"]
+        if self.early_stopping is not None:
+            self.early_stopping.curve = checkpoint["curve"]
+        print("Resuming {} after {} epochs".format(self.name, checkpoint["epochs"]))
+        return checkpoint["epochs"]
+
+    def train(self, force=False, checkpoint_epochs=None, checkpoint_minutes=None):
+        """ Training method
+
+        Training is skipped and the saved model is loaded when it was trained with the same inputs (See fingerprint)
+
+        When checkpointing or early stopping, epochs are run by chunks with the learning rate decaying linearly over the
+        whole training as it would in a single call. Training resumes from the latest valid checkpoint and stops as soon
+        as self.early_stopping says so, its curve being written next to the model.
+
+        :param force: Train even if the saved model is up to date
+        :param checkpoint_epochs: Save a checkpoint every N epochs
+        :param checkpoint_minutes: Save a checkpoint every N minutes
+        """
+        if not force and self.__model__ is None and self.is_up_to_date():
+            print("{} is up to date, skipping training".format(self.name))
+            self.load()
+            return
+        self.__neighbours__ = None
+        self.__index__ = None
+        checkpointing = checkpoint_epochs is not None or checkpoint_minutes is not None
+        done = 0
+        if checkpointing and self.__model__ is None:
+            done = self.resume()
         if self.__model__ is None:
             if self.preload is not None:
                 self.__model__ = Word2Vec.load(self.preload.output)
             else:
                 self.__model__ = Word2Vec(**self.parameters)
                 self.model.build_vocab(self.sentences)
-        self.model.train(self.sentences, total_examples=self.count, epochs=self.epochs)
+        # Same total_examples whatever the corpus mode, so that the learning rate decays the same way
+        total_examples = self.count
+
+        if not checkpointing and self.early_stopping is None:
+            self.model.train(self.sentences, total_examples=total_examples, epochs=self.epochs)
+        else:
+            alpha, min_alpha = self.model.alpha, self.model.min_alpha
+            if self.early_stopping is not None:
+                chunk = self.early_stopping.chunk
+            else:
+                chunk = checkpoint_epochs or 1
+            last_checkpoint, checkpointed = time(), done
+            while done < self.epochs:
+                epochs = min(chunk, self.epochs - done)
+                self.model.train(
+                    self.sentences, total_examples=total_examples, epochs=epochs,
+                    start_alpha=alpha - (alpha - min_alpha) * done / self.epochs,
+                    end_alpha=alpha - (alpha - min_alpha) * (done + epochs) / self.epochs
+                )
+                done += epochs
+                if self.early_stopping is not None and self.early_stopping(self, done):
+                    print("Stopping {} after {} epochs".format(self.name, done))
+                    break
+                if done < self.epochs and checkpointing and (
+                    (checkpoint_epochs is not None and done - checkpointed >= checkpoint_epochs) or
+                    (checkpoint_minutes is not None and time() - last_checkpoint >= checkpoint_minutes * 60)
+                ):
+                    self.checkpoint(done)
+                    last_checkpoint, checkpointed = time(), done
+            if self.early_stopping is not None:
+                self.early_stopping.write(self.curve_output)
+
+        if isfile(self.fingerprint_output):
+            remove(self.fingerprint_output)
         self.model.save(self.output)
+        self.write_fingerprint()
+        if isfile(self.checkpoint_output):
+            remove(self.checkpoint_output)
+        self.open_neighbours()
+
+    def load(self, mmap=None, vectors=False):
+        """ Load the model
+
+        :param mmap: Memory-map the large arrays saved separately by gensim (e.g. "r" for read-only)
+        :param vectors: Open the vectors written by export() instead, memory-mapped read-only. Only similarity queries
+            are then available.
+        """
+        if vectors:
+            self.__model__ = NormalisedVectors.load(self.vectors_output, self.vocabulary_output)
+            self.__word2index__ = self.model.vocab
+            self.open_neighbours(self.vectors_output)
+        else:
+            self.__model__ = Word2Vec.load(self.output, mmap=mmap)
+            self.__word2index__ = None
+            self.open_neighbours()
+
+    @property
+    def vectors_output(self):
+        """ Name of the exported normalised vectors """
+        return join(self.output_dir, self.name+".vectors.npy")
+
+    @property
+    def vocabulary_output(self):
+        """ Name of the exported vocabulary """
+        return join(self.output_dir, self.name+".vocab.txt")
+
+    def export(self):
+        """ Write the unit-normalised vectors as a .npy file that can be memory-mapped and the vocabulary as text,
+        leaving out the training state of the model
+        """
+        with open(self.vocabulary_output, "w") as f:
+            f.write("\n".join(self.index2word))
+        np.save(self.vectors_output, np.ascontiguousarray(self.vectors))
+
+    def is_exported(self):
+        """ Check that the exported vectors are more recent than the saved model
+
+        :rtype: bool
+        """
+        return isfile(self.vectors_output) and isfile(self.vocabulary_output) and (
+            not isfile(self.output) or getmtime(self.vectors_output) >= getmtime(self.output)
+        )
+
+    @property
+    def neighbours_output(self):
+        """ Name of the output neighbour cache """
+        return join(self.output_dir, self.name+".neighbours.pickle")
+
+    @property
+    def neighbours(self):
+        """ Cache of the neighbours of the saved model, None while the model is not saved
+
+        :rtype: NeighbourCache
+        """
+        return self.__neighbours__
 
-    def load(self):
-        """ Load the model """
-        self.__model__ = Word2Vec.load(self.output)
+    def open_neighbours(self, path=None):
+        """ Open the neighbour cache and the approximate nearest-neighbour index of the saved model, keyed by its
+        fingerprint and file version
+
+        :param path: File the model was loaded from (Default: self.output)
+        """
+        if path is None:
+            path = self.output
+        self.__version__ = "{}:{}:{}".format(self.saved_fingerprint, getmtime(path), getsize(path))
+        if self.cache_size:
+            self.__neighbours__ = NeighbourCache(self.neighbours_output, self.__version__, max_size=self.cache_size)
+        self.__index__ = InvertedFileIndex.load(self.index_output, self.__version__)
+
+    def save_neighbours(self):
+        """ Write the neighbour cache to disk """
+        if self.neighbours is not None:
+            self.neighbours.save()
+
+    @property
+    def index_output(self):
+        """ Name of the output approximate nearest-neighbour index """
+        return join(self.output_dir, self.name+".ivf.npz")
+
+    @property
+    def index(self):
+        """ Approximate nearest-neighbour index of the saved model, None until built
+
+        :rtype: InvertedFileIndex
+        """
+        return self.__index__
+
+    def build_index(self, lists=None, iterations=10):
+        """ Build the approximate nearest-neighbour index of the saved model and write it next to it
+
+        :param lists: Number of lists the vocabulary is split in (Default: square root of the vocabulary size)
+        :param iterations: Number of k-means iterations
+        :rtype: InvertedFileIndex
+        """
+        self.__index__ = InvertedFileIndex.build(self.vectors, lists=lists, iterations=iterations, key=self.__version__)
+        if self.__version__ is not None:
+            self.__index__.save(self.index_output)
+        return self.__index__
+
+    @property
+    def vectors(self):
+        """ Unit-normalised vectors, one row per word of self.index2word
+
+        :rtype: numpy.ndarray
+        """
+        self.model.init_sims()
+        return self.model.wv.syn0norm
+
+    @property
+    def index2word(self):
+        """ List of the words of the model, in the order of self.vectors """
+        return self.model.wv.index2word
+
+    @property
+    def word2index(self):
+        """ Dictionary of the row of each word in self.vectors """
+        if self.__word2index__ is None:
+            self.__word2index__ = {word: index for index, word in enumerate(self.index2word)}
+        return self.__word2index__
 
     def similarity(self, w1, w2):
         """ Compute the similarity between two words """
@@ -121,13 +478,28 @@ class W2VModel(object):
         """ In a list of words, tell which one is not fitting in the group"""
         return self.model.doesnt_match(words)
 
-    def most_similar(self, word, n=5):
-        """ Compute the @n similar words to @word """
-        return self.model.most_similar([word], topn=n)  # + self.model.most_similar(negative=[word], topn=n)
+    def most_similar(self, word, n=5, probe=None):
+        """ Compute the @n similar words to @word, going through the neighbour cache when the model is saved
+
+        :param probe: Number of lists of the index scanned when the word is not cached (Default: self.probe). The
+            approximate neighbours are not cached.
+        """
+        if probe is None:
+            probe = self.probe
+        neighbours = self.neighbours.get(word, n) if self.neighbours is not None else None
+        if neighbours is not None:
+            return neighbours
+        if probe is not None and self.index is not None:
+            row = self.word2index[word]
+            rows, scores = self.index.search(self.vectors, self.vectors[row], n=n, probe=probe, exclude=[row])
+            return [(self.index2word[i], float(score)) for i, score in zip(rows, scores)]
+        if self.neighbours is None:
+            return self.model.most_similar([word], topn=n)  # + self.model.most_similar(negative=[word], topn=n)
+        neighbours = self.model.most_similar([word], topn=max(n, 10))
+        self.neighbours.put(word, neighbours)
+        return neighbours[:n]
 
     @property
     def occurences(self):
         """ Dictionary of occurrences """
-        if self.__occurences__ is None:
-            self.__occurences__ = Counter([w for s in self.files for w in s.split()])
-        return self.__occurences__
+        return self.statistics.occurences
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from os.path import isfile
+from os import replace
+import pickle
+
+
+class NeighbourCache(object):
+    """ Bounded, persistent cache of the nearest neighbours of words for a given saved model
+
+    Entries are evicted in least recently used order once @max_size words are cached. The cache is only reloaded
+    from @path if it was saved for the same @key, i.e. for the same version of the model.
+
+    :param path: Path of the pickle file
+    :param key: Identifier of the model version the neighbours were computed with
+    :param max_size: Maximum number of words kept
+    """
+    def __init__(self, path, key, max_size=10000):
+        self.path = path
+        self.key = key
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.dirty = False
+        if isfile(path):
+            with open(path, "rb") as f:
+                saved = pickle.load(f)
+            if saved["key"] == key:
+                self.entries = saved["entries"]
+
+    def __contains__(self, word):
+        return word in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, word, n):
+        """ Get the @n nearest neighbours of @word
+
+        :param word: Word to look up
+        :param n: Number of neighbours
+        :return: List of (word, similarity), None if fewer than n neighbours are cached
+        """
+        neighbours = self.entries.get(word)
+        if neighbours is None or len(neighbours) < n:
+            return None
+        self.entries.move_to_end(word)
+        return neighbours[:n]
+
+    def put(self, word, neighbours):
+        """ Record the nearest neighbours of @word
+
+        :param word: Word looked up
+        :param neighbours: List of (word, similarity), best first
+        """
+        self.entries[word] = list(neighbours)
+        self.entries.move_to_end(word)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    def save(self):
+        """ Atomically write the cache if it changed """
+        if not self.dirty:
+            return
+        with open(self.path + ".tmp", "wb") as f:
+            pickle.dump({"key": self.key, "entries": self.entries}, f)
+        replace(self.path + ".tmp", self.path)
+        self.dirty = False
@@ -0,0 +1,224 @@
+from collections import Counter
+from glob import glob
+from os.path import getmtime, isfile, join
+from Code.utils import packed
+import numpy as np
+import pickle
+
+
+def corpus_files(directory):
+    """ Generator yield the list of files that are supposed to form the corpus
+
+    :param directory: Path (or list of paths) of the corpus, a directory searched recursively or a single .txt file
+    """
+    if isinstance(directory, list):
+        for path in directory:
+            for file in glob(join(path, "**/*.txt"), recursive=True):
+                yield file
+    elif directory.endswith(".txt"):
+        yield directory
+    else:
+        for file in glob(join(directory, "**/*.txt"), recursive=True):
+            yield file
+
+
+class CorpusStatistics(object):
+    """ Vocabulary, frequencies and totals of a corpus, keyed by the corpus path and the modification times of its files
+
+    :param directory: Path (or list of paths) of the corpus
+    :param files: List of paths of the files forming the corpus
+    :type files: [str]
+    """
+    def __init__(self, directory, files):
+        self.directory = directory
+        self.files = {file: getmtime(file) for file in files}
+        self.occurences = Counter()
+        self.sentences = 0
+        self.tokens = 0
+
+    def add(self, sentence):
+        """ Record a tokenised sentence
+
+        :param sentence: List of tokens
+        :type sentence: [str]
+        """
+        self.occurences.update(sentence)
+        self.sentences += 1
+        self.tokens += len(sentence)
+
+    @property
+    def vocabulary(self):
+        """ Vocabulary (Set of words) """
+        return set(self.occurences.keys())
+
+    def matches(self, directory, files):
+        """ Check that these statistics were computed for this corpus in its current state
+
+        :param directory: Path (or list of paths) of the corpus
+        :param files: List of paths of the files forming the corpus
+        :type files: [str]
+        :rtype: bool
+        """
+        if directory != self.directory:
+            return False
+        files = list(files)
+        if len(files) != len(self.files):
+            return False
+        for file in files:
+            if file not in self.files or not isfile(file) or getmtime(file) != self.files[file]:
+                return False
+        return True
+
+    @classmethod
+    def from_documents(cls, directory, files, documents):
+        """ Compute the statistics in one pass over documents
+
+        :param directory: Path (or list of paths) of the corpus
+        :param files: List of paths of the files forming the corpus
+        :param documents: Iterable of untokenised documents
+        :rtype: CorpusStatistics
+        """
+        statistics = cls(directory, files)
+        for document in documents:
+            statistics.add(document.split())
+        return statistics
+
+    def save(self, path):
+        """ Save the statistics
+
+        :param path: Path of the pickle file
+        """
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        """ Load saved statistics
+
+        :param path: Path of the pickle file
+        :rtype: CorpusStatistics
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+class StreamingCorpus(object):
+    """ Re-iterable corpus reading its files lazily, one document per file
+
+    Gensim walks the corpus once for the vocabulary and once per epoch : each walk re-opens the files so that only
+    one document is held in memory at a time. The first complete walk also collects the CorpusStatistics so that
+    the corpus is never tokenised twice.
+
+    :param files: List of paths of the files forming the corpus
+    :type files: [str]
+    :param directory: Path (or list of paths) of the corpus, used to key the statistics
+    :param statistics: Already computed statistics for this corpus
+    :type statistics: CorpusStatistics
+    """
+    def __init__(self, files, directory=None, statistics=None):
+        self.files = list(files)
+        self.directory = directory
+        self.__statistics__ = statistics
+
+    def __iter__(self):
+        statistics = None
+        if self.__statistics__ is None:
+            statistics = CorpusStatistics(self.directory, self.files)
+        for file in self.files:
+            with open(file) as f:
+                sentence = f.read().split()
+            if statistics is not None:
+                statistics.add(sentence)
+            yield sentence
+        if statistics is not None:
+            self.__statistics__ = statistics
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def statistics(self):
+        """ Statistics of the corpus, walking it once if they have not been collected yet
+
+        :rtype: CorpusStatistics
+        """
+        if self.__statistics__ is None:
+            for _ in self:
+                pass
+        return self.__statistics__
+
+    @property
+    def occurences(self):
+        """ Dictionary of occurrences """
+        return self.statistics.occurences
+
+    @property
+    def sentences(self):
+        """ Number of sentences (documents) in the corpus """
+        return self.statistics.sentences
+
+    @property
+    def tokens(self):
+        """ Number of tokens in the corpus """
+        return self.statistics.tokens
+
+
+class PackedCorpus(object):
+    """ Re-iterable corpus read from packed corpora (See Code.utils.packed), one document per original file
+
+    Tokens and offsets are memory-mapped and only turned into words one document at a time. The statistics are
+    computed with a bincount over the token ids, without reading any text.
+
+    :param paths: Path (or list of paths) of the packed corpora, without suffix
+    :param directory: Path (or list of paths) of the corpus, used to key the statistics
+    :param mmap: Memory-map mode of the tokens and offsets, None to read them in memory
+    """
+    def __init__(self, paths, directory=None, mmap="r"):
+        if not isinstance(paths, list):
+            paths = [paths]
+        self.paths = paths
+        self.directory = directory
+        self.corpora = [packed.load(path, mmap=mmap) for path in paths]
+        self.__statistics__ = None
+
+    def __iter__(self):
+        for words, tokens, offsets in self.corpora:
+            words = np.array(words, dtype=object)
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                yield words[tokens[start:end]].tolist()
+
+    def __len__(self):
+        return sum(len(offsets) - 1 for _, _, offsets in self.corpora)
+
+    @property
+    def statistics(self):
+        """ Statistics of the corpus
+
+        :rtype: CorpusStatistics
+        """
+        if self.__statistics__ is None:
+            statistics = CorpusStatistics(self.directory, [
+                file for path in self.paths for file in packed.packed_paths(path)
+            ])
+            for words, tokens, offsets in self.corpora:
+                counts = np.bincount(tokens, minlength=len(words))
+                statistics.occurences.update({word: int(count) for word, count in zip(words, counts) if count})
+                statistics.sentences += len(offsets) - 1
+                statistics.tokens += len(tokens)
+            self.__statistics__ = statistics
+        return self.__statistics__
+
+    @property
+    def occurences(self):
+        """ Dictionary of occurrences """
+        return self.statistics.occurences
+
+    @property
+    def sentences(self):
+        """ Number of sentences (documents) in the corpus """
+        return self.statistics.sentences
+
+    @property
+    def tokens(self):
+        """ Number of tokens in the corpus """
+        return self.statistics.tokens
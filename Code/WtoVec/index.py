@@ -0,0 +1,162 @@
+from os import replace
+from os.path import isfile
+from time import time
+from scipy import sparse
+import numpy as np
+
+
+def best(scores, k):
+    """ Positions of the @k highest @scores, best first
+
+    :type scores: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    selected = np.argpartition(-scores, k - 1)[:k]
+    return selected[np.argsort(-scores[selected], kind="mergesort")]
+
+
+class InvertedFileIndex(object):
+    """ Approximate nearest-neighbour index of unit-normalised vectors, split in lists around k-means centroids
+
+    A query only scans the vectors of the @probe lists whose centroids are the most similar to it : recall grows and
+    speed drops with @probe, up to an exact scan when every list is probed.
+
+    :param centroids: Unit-normalised centroid of each list
+    :type centroids: numpy.ndarray
+    :param order: Rows of the indexed vectors, grouped by list
+    :type order: numpy.ndarray
+    :param offsets: Start of each list in @order, followed by len(order)
+    :type offsets: numpy.ndarray
+    :param key: Identifier of the version of the vectors the index was built for
+    """
+    def __init__(self, centroids, order, offsets, key=None):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.key = key
+
+    def __len__(self):
+        return len(self.centroids)
+
+    @staticmethod
+    def assign(vectors, centroids, batch_size=4096):
+        """ Most similar centroid of each vector
+
+        :param vectors: Unit-normalised vectors
+        :param centroids: Unit-normalised centroids
+        :param batch_size: Number of vectors compared at once
+        :rtype: numpy.ndarray
+        """
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            assignment[start:start+batch_size] = np.dot(vectors[start:start+batch_size], centroids.T).argmax(axis=1)
+        return assignment
+
+    @classmethod
+    def build(cls, vectors, lists=None, iterations=10, seed=0, batch_size=4096, key=None):
+        """ Cluster the vectors with spherical k-means and index them by cluster
+
+        :param vectors: Unit-normalised vectors, one row per word
+        :type vectors: numpy.ndarray
+        :param lists: Number of lists (Default: square root of the number of vectors)
+        :param iterations: Number of k-means iterations
+        :param seed: Seed of the choice of the initial centroids
+        :param batch_size: Number of vectors compared at once
+        :param key: Identifier of the version of the vectors
+        :rtype: InvertedFileIndex
+        """
+        if lists is None:
+            lists = max(1, int(round(np.sqrt(len(vectors)))))
+        lists = min(lists, len(vectors))
+        random = np.random.RandomState(seed)
+        centroids = np.array(vectors[np.sort(random.choice(len(vectors), lists, replace=False))], dtype=np.float32)
+        for _ in range(iterations):
+            sums = np.zeros(centroids.shape, dtype=np.float64)
+            for start in range(0, len(vectors), batch_size):
+                batch = vectors[start:start+batch_size]
+                assignment = np.dot(batch, centroids.T).argmax(axis=1)
+                membership = sparse.csr_matrix(
+                    (np.ones(len(batch)), (assignment, np.arange(len(batch)))), shape=(lists, len(batch))
+                )
+                sums += membership.dot(batch)
+            norms = np.sqrt((sums ** 2).sum(axis=1))
+            filled = norms > 0
+            centroids[filled] = sums[filled] / norms[filled, None]
+        assignment = cls.assign(vectors, centroids, batch_size)
+        order = np.argsort(assignment, kind="mergesort")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))])
+        return cls(centroids, order, offsets, key=key)
+
+    def search(self, vectors, query, n=10, probe=1, exclude=None):
+        """ Find the @n indexed vectors most similar to @query among the @probe closest lists
+
+        :param vectors: The indexed vectors
+        :param query: Unit-normalised query vector
+        :param n: Number of neighbours
+        :param probe: Number of lists scanned
+        :param exclude: Rows never returned (e.g. the query word itself)
+        :return: Rows and similarities of the neighbours, best first
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        lists = best(np.dot(self.centroids, query), probe)
+        candidates = np.sort(np.concatenate([self.order[self.offsets[i]:self.offsets[i+1]] for i in lists]))
+        if exclude is not None:
+            candidates = np.setdiff1d(candidates, exclude)
+        scores = np.dot(vectors[candidates], query)
+        selected = best(scores, n)
+        return candidates[selected], scores[selected]
+
+    def save(self, path):
+        """ Atomically write the index as a .npz file
+
+        :param path: Path of the file, ending with .npz
+        """
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, order=self.order, offsets=self.offsets, key=np.array(self.key))
+        replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, key=None):
+        """ Read a saved index
+
+        :param path: Path of the .npz file
+        :param key: Version of the vectors the index must have been built for
+        :return: The index, None if there is none or if it was built for another version of the vectors
+        :rtype: InvertedFileIndex
+        """
+        if not isfile(path):
+            return None
+        with np.load(path) as saved:
+            if str(saved["key"]) != str(key):
+                return None
+            return cls(saved["centroids"], saved["order"], saved["offsets"], key=key)
+
+
+def recall(index, vectors, rows, k=10, probes=(1, 2, 4, 8)):
+    """ Compare the neighbours found through @index to the ones of an exact scan
+
+    :param index: The index of the vectors
+    :type index: InvertedFileIndex
+    :param vectors: Unit-normalised vectors
+    :param rows: Rows of the query words
+    :param k: Number of neighbours
+    :param probes: Numbers of lists scanned to compare
+    :return: List of (probe, recall@k, seconds per query), with an exact scan first as probe None
+    """
+    start = time()
+    exact = []
+    for row in rows:
+        scores = np.dot(vectors, vectors[row])
+        scores[row] = -np.inf
+        exact.append(set(best(scores, k)))
+    results = [(None, 1.0, (time() - start) / len(rows))]
+    for probe in probes:
+        start, found = time(), 0
+        for row, neighbours in zip(rows, exact):
+            approximate, _ = index.search(vectors, vectors[row], n=k, probe=probe, exclude=[row])
+            found += len(neighbours.intersection(approximate))
+        results.append((probe, found / (k * len(rows)), (time() - start) / len(rows)))
+    return results
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class WordVectors(object):
+    """ Unit-normalised vectors and their vocabulary """
+    def __init__(self, syn0norm, index2word):
+        self.syn0norm = syn0norm
+        self.index2word = index2word
+
+
+class NormalisedVectors(object):
+    """ Read-only word vectors exported by W2VModel.export, answering similarity queries like a gensim Word2Vec
+
+    Only the unit-normalised vectors and the vocabulary are kept, without any of the training state, and the vectors
+    are usually a read-only numpy.memmap.
+
+    :param vectors: Unit-normalised vectors, one row per word
+    :type vectors: numpy.ndarray
+    :param index2word: List of the words, in the order of the vectors
+    :type index2word: [str]
+    """
+    def __init__(self, vectors, index2word):
+        self.wv = WordVectors(vectors, index2word)
+        self.vocab = {word: index for index, word in enumerate(index2word)}
+
+    @classmethod
+    def load(cls, vectors_path, vocabulary_path, mmap="r"):
+        """ Open exported vectors
+
+        :param vectors_path: Path of the .npy file of the vectors
+        :param vocabulary_path: Path of the vocabulary, one word per line
+        :param mmap: Memory-map mode of the vectors, None to read them in memory
+        :rtype: NormalisedVectors
+        """
+        with open(vocabulary_path) as f:
+            index2word = f.read().split("\n")
+        return cls(np.load(vectors_path, mmap_mode=mmap), index2word)
+
+    def __contains__(self, word):
+        return word in self.vocab
+
+    def index(self, word):
+        """ Row of a word
+
+        :raises KeyError: if the word is not in the vocabulary
+        """
+        if word not in self.vocab:
+            raise KeyError("word '{}' not in vocabulary".format(word))
+        return self.vocab[word]
+
+    def init_sims(self, replace=False):
+        """ Vectors are already normalised """
+
+    def clear_sims(self):
+        """ Vectors are already normalised """
+
+    def similarity(self, w1, w2):
+        """ Cosine similarity between two words """
+        return np.dot(self.wv.syn0norm[self.index(w1)], self.wv.syn0norm[self.index(w2)])
+
+    def most_similar(self, positive, topn=10):
+        """ Find the @topn most similar words to the mean of the @positive words
+
+        :param positive: List of words
+        :param topn: Number of words to return
+        :return: List of (word, similarity)
+        """
+        rows = [self.index(word) for word in positive]
+        mean = self.wv.syn0norm[rows].mean(axis=0)
+        mean /= np.sqrt(np.dot(mean, mean))
+        dists = np.dot(self.wv.syn0norm, mean)
+        count = min(topn + len(rows), len(dists))
+        best = np.argpartition(-dists, count - 1)[:count]
+        best = best[np.argsort(-dists[best], kind="mergesort")]
+        return [(self.wv.index2word[i], float(dists[i])) for i in best if i not in rows][:topn]
+
+    def doesnt_match(self, words):
+        """ In a list of words, tell which one is the furthest away from the mean of the others """
+        used = [word for word in words if word in self.vocab]
+        if not used:
+            raise ValueError("cannot select a word from an empty list")
+        vectors = self.wv.syn0norm[[self.vocab[word] for word in used]]
+        mean = vectors.mean(axis=0)
+        mean /= np.sqrt(np.dot(mean, mean))
+        return sorted(zip(np.dot(vectors, mean), used))[0][1]
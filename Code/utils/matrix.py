@@ -0,0 +1,306 @@
+import numpy as np
+from itertools import chain, islice
+from scipy import sparse
+
+
+def normalise(rows):
+    """ Scale each row to unit length, leaving null rows at zero
+
+    :param rows: the matrix whose rows are normalised
+    :type rows: np.ndarray or scipy.sparse.csr_matrix
+    :return: the normalised rows, sparse if @rows is sparse
+    :rtype: np.ndarray or scipy.sparse.csr_matrix
+    """
+    if sparse.issparse(rows):
+        norms = np.sqrt(np.asarray(rows.multiply(rows).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms, 0).dot(rows).tocsr()
+    norms = np.sqrt((rows ** 2).sum(axis=-1, keepdims=True))
+    norms[norms == 0] = 1
+    return rows / norms
+
+
+def cosines(rows):
+    """ Cosine similarities between all pairs of rows
+
+    :param rows: the rows compared
+    :type rows: np.ndarray or scipy.sparse.csr_matrix
+    :return: the (len(rows), len(rows)) similarities
+    :rtype: np.ndarray
+    """
+    normalised = normalise(rows)
+    if sparse.issparse(normalised):
+        return normalised.dot(normalised.T).toarray()
+    return np.dot(normalised, normalised.T)
+
+
+def ranked(row, k):
+    """ Indices of the @k highest scores of a row, best first, in the order of a stable sort of the whole row
+
+    The @k-th score is found by partial selection; only the scores above it and the first ones equal to it are sorted.
+
+    :param row: the scores
+    :type row: np.ndarray
+    :param k: the number of indices
+    :type k: int
+    :rtype: np.ndarray
+    """
+    k = min(k, len(row))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    kth = -np.partition(-row, k - 1)[k - 1]
+    above = np.flatnonzero(row > kth)
+    best = np.concatenate([above, np.flatnonzero(row == kth)[:k - len(above)]])
+    return best[np.argsort(-row[best], kind='mergesort')]
+
+
+class SignificanceMatrix(object):
+    """ Square word x word matrix (co-occurrence significance or similarity scores) addressed by word
+
+    The array is never copied : with an np.memmap, only the rows that are asked for are read from disk, by chunks of
+    @chunk_size rows in file order, so that memory grows with the number of rows used and not with the vocabulary.
+
+    :param arr: the matrix
+    :type arr: np.ndarray or np.memmap
+    :param ind: the index of words for arr
+    :type ind: list
+    :param chunk_size: the number of rows read at once
+    :type chunk_size: int
+    """
+    def __init__(self, arr, ind, chunk_size=1024):
+        self.arr = arr
+        self.ind = list(ind)
+        self.index = {word: i for i, word in enumerate(self.ind)}
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def load(cls, path, index_path, mmap='r', chunk_size=1024):
+        """ Opens a matrix saved as a .npy file with its index saved as a text file with one word per line
+
+        :param path: the path of the .npy matrix
+        :param index_path: the path of the index
+        :param mmap: the memory-map mode, None to read the matrix in memory
+        :rtype: SignificanceMatrix
+        """
+        with open(index_path) as f:
+            ind = f.read().split('\n')
+        return cls(np.load(path, mmap_mode=mmap), ind, chunk_size=chunk_size)
+
+    def save(self, path, index_path):
+        """ Saves the matrix as a .npy file and its index as a text file with one word per line
+
+        :param path: the path of the .npy matrix
+        :param index_path: the path of the index
+        """
+        np.save(path, self.arr)
+        with open(index_path, mode='w') as f:
+            f.write('\n'.join(self.ind))
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __len__(self):
+        return len(self.ind)
+
+    def chunks(self, rows):
+        """ Reads rows by chunks, in file order
+
+        :param rows: the row indices
+        :type rows: np.ndarray
+        :return: generator of (positions of the rows in @rows, float64 block of the rows)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind='mergesort')
+        for start in range(0, len(order), self.chunk_size):
+            positions = order[start:start + self.chunk_size]
+            yield positions, np.asarray(self.arr[rows[positions]], dtype=np.float64)
+
+    def gather(self, rows):
+        """ Reads rows as a float64 matrix
+
+        :param rows: the row indices
+        :type rows: np.ndarray
+        :rtype: np.ndarray
+        """
+        gathered = np.empty((len(rows), self.arr.shape[1]), dtype=np.float64)
+        for positions, block in self.chunks(rows):
+            gathered[positions] = block
+        return gathered
+
+    def row(self, word):
+        """ Reads the row of a word
+
+        :raises KeyError: if the word is not in the index
+        :rtype: np.ndarray
+        """
+        return np.asarray(self.arr[self.index[word]], dtype=np.float64)
+
+    def most_similar(self, target, n=5):
+        """ finds the most similar candidate words to a target word, the best score of the row (the word itself) excluded
+
+        :param target: the target word
+        :type target: str
+        :param n: the number of similarity candidates to return
+        :type n: int
+        :return: the n most similar words with their scores
+        :rtype: list
+        """
+        row = self.row(target.lower())
+        return [(self.ind[i], row[i]) for i in ranked(row, n + 1)[1:]]
+
+    def neighbours(self, words, n=5):
+        """ finds the most similar candidate words of many target words at once, reading their rows by chunks
+
+        :param words: the target words, which must all be in the index
+        :type words: list
+        :param n: the number of similarity candidates to return for each word
+        :type n: int
+        :return: the n most similar words with their scores, for each target word
+        :rtype: dict
+        """
+        rows = np.array([self.index[word.lower()] for word in words], dtype=np.int64)
+        neighbours = {}
+        for positions, block in self.chunks(rows):
+            for position, row in zip(positions, block):
+                neighbours[words[position]] = [(self.ind[i], row[i]) for i in ranked(row, n + 1)[1:]]
+        return neighbours
+
+    def similarity(self, w1, w2):
+        """ returns the score of two words
+
+        :param w1: word 1
+        :type w1: str
+        :param w2: word 2
+        :type w2: str
+        :return: the similarity score of the two words
+        :rtype: float
+        """
+        return self.arr[self.index[w1.lower()], self.index[w2.lower()]]
+
+
+class SparseSignificanceMatrix(SignificanceMatrix):
+    """ Square word x word matrix stored as a CSR matrix, for co-occurrence significance scores that are mostly zero
+
+    Rows are read and returned as CSR blocks : memory grows with the number of non-zero scores of the rows used. Saved
+    matrices are three .npy files (data, indices, indptr) which can be memory-mapped.
+
+    :param arr: the matrix, converted to CSR
+    :type arr: scipy.sparse.spmatrix or np.ndarray
+    :param ind: the index of words for arr
+    :type ind: list
+    :param chunk_size: the number of rows read at once
+    :type chunk_size: int
+    """
+    def __init__(self, arr, ind, chunk_size=1024):
+        super(SparseSignificanceMatrix, self).__init__(sparse.csr_matrix(arr), ind, chunk_size=chunk_size)
+
+    @staticmethod
+    def paths(path):
+        """ Paths of the data, indices and indptr arrays of a matrix saved at @path """
+        return [path + '.data.npy', path + '.indices.npy', path + '.indptr.npy']
+
+    @classmethod
+    def load(cls, path, index_path, mmap='r', chunk_size=1024):
+        """ Opens a matrix saved by save()
+
+        :param path: the path the matrix was saved at, without the .data.npy, .indices.npy or .indptr.npy suffix
+        :param index_path: the path of the index
+        :param mmap: the memory-map mode, None to read the matrix in memory
+        :rtype: SparseSignificanceMatrix
+        """
+        with open(index_path) as f:
+            ind = f.read().split('\n')
+        data, indices, indptr = [np.load(part, mmap_mode=mmap) for part in cls.paths(path)]
+        arr = sparse.csr_matrix((data, indices, indptr), shape=(len(ind), len(ind)), copy=False)
+        return cls(arr, ind, chunk_size=chunk_size)
+
+    def save(self, path, index_path):
+        """ Saves the matrix as three .npy files (data, indices, indptr) and its index as a text file with one word per line
+
+        :param path: the path of the matrix, suffixed with .data.npy, .indices.npy and .indptr.npy
+        :param index_path: the path of the index
+        """
+        for part, values in zip(self.paths(path), [self.arr.data, self.arr.indices, self.arr.indptr]):
+            np.save(part, values)
+        with open(index_path, mode='w') as f:
+            f.write('\n'.join(self.ind))
+
+    def chunks(self, rows):
+        """ Reads rows by chunks, in file order
+
+        :param rows: the row indices
+        :type rows: np.ndarray
+        :return: generator of (positions of the rows in @rows, float64 CSR block of the rows)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind='mergesort')
+        for start in range(0, len(order), self.chunk_size):
+            positions = order[start:start + self.chunk_size]
+            yield positions, self.arr[rows[positions]].astype(np.float64)
+
+    def gather(self, rows):
+        """ Reads rows as a float64 CSR matrix
+
+        :param rows: the row indices
+        :type rows: np.ndarray
+        :rtype: scipy.sparse.csr_matrix
+        """
+        return self.arr[np.asarray(rows, dtype=np.int64)].astype(np.float64)
+
+    def row(self, word):
+        """ Reads the row of a word
+
+        :raises KeyError: if the word is not in the index
+        :rtype: np.ndarray
+        """
+        return self.arr[self.index[word]].toarray().ravel().astype(np.float64)
+
+    def most_similar(self, target, n=5):
+        """ finds the most similar candidate words to a target word, the best score of the row (the word itself) excluded
+
+        Only the non-zero scores of the row are sorted : zero scores come after the positive ones and before the negative
+        ones, in index order, as with a dense row.
+
+        :param target: the target word
+        :type target: str
+        :param n: the number of similarity candidates to return
+        :type n: int
+        :return: the n most similar words with their scores
+        :rtype: list
+        """
+        row = self.arr[self.index[target.lower()]]
+        values, columns = row.data.astype(np.float64), row.indices
+        order = np.lexsort((columns, -values))
+        values, columns = values[order], columns[order]
+        stored = set(columns[values != 0])
+        zeros = (column for column in range(self.arr.shape[1]) if column not in stored)
+        best = islice(chain(
+            zip(columns[values > 0], values[values > 0]),
+            ((column, 0.0) for column in zeros),
+            zip(columns[values < 0], values[values < 0])
+        ), n + 1)
+        return [(self.ind[i], score) for i, score in best][1:]
+
+    def neighbours(self, words, n=5):
+        """ finds the most similar candidate words of many target words, from the non-zero scores of their rows
+
+        :param words: the target words, which must all be in the index
+        :type words: list
+        :param n: the number of similarity candidates to return for each word
+        :type n: int
+        :return: the n most similar words with their scores, for each target word
+        :rtype: dict
+        """
+        return {word: self.most_similar(word, n) for word in words}
+
+    def similarity(self, w1, w2):
+        """ returns the score of two words
+
+        :param w1: word 1
+        :type w1: str
+        :param w2: word 2
+        :type w2: str
+        :return: the similarity score of the two words
+        :rtype: float
+        """
+        return self.arr[self.index[w1.lower()], self.index[w2.lower()]]
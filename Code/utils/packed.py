@@ -0,0 +1,53 @@
+from os import replace
+import numpy as np
+
+
+def packed_paths(path):
+    """ Paths of the vocabulary, tokens and offsets of a packed corpus
+
+    :param path: Path of the packed corpus, without suffix
+    :return: (vocabulary path, tokens path, offsets path)
+    """
+    return path + ".vocab", path + ".tokens.npy", path + ".offsets.npy"
+
+
+def pack(files, path):
+    """ Write the documents of a corpus, one per file, as a packed corpus
+
+    The vocabulary is written one word per line, in order of first occurrence, the tokens of every document as one
+    contiguous array of int32 word ids and the offsets as an array of len(files) + 1 int64 positions, document i being
+    tokens[offsets[i]:offsets[i+1]].
+
+    :param files: List of paths of the files forming the corpus
+    :param path: Path of the packed corpus, without suffix
+    """
+    vocabulary, documents, offsets = {}, [], [0]
+    for file in files:
+        with open(file) as f:
+            tokens = f.read().split()
+        documents.append(np.array([vocabulary.setdefault(token, len(vocabulary)) for token in tokens], dtype=np.int32))
+        offsets.append(offsets[-1] + len(tokens))
+    vocabulary_path, tokens_path, offsets_path = packed_paths(path)
+    for target, values in [
+        (tokens_path, np.concatenate(documents) if documents else np.array([], dtype=np.int32)),
+        (offsets_path, np.array(offsets, dtype=np.int64))
+    ]:
+        with open(target + ".tmp", "wb") as f:
+            np.save(f, values)
+        replace(target + ".tmp", target)
+    with open(vocabulary_path + ".tmp", "w") as f:
+        f.write("\n".join(vocabulary))
+    replace(vocabulary_path + ".tmp", vocabulary_path)
+
+
+def load(path, mmap="r"):
+    """ Open a packed corpus
+
+    :param path: Path of the packed corpus, without suffix
+    :param mmap: Memory-map mode of the tokens and offsets, None to read them in memory
+    :return: (list of the words, tokens, offsets)
+    """
+    vocabulary_path, tokens_path, offsets_path = packed_paths(path)
+    with open(vocabulary_path) as f:
+        words = f.read().split("\n")
+    return words, np.load(tokens_path, mmap_mode=mmap), np.load(offsets_path, mmap_mode=mmap)
@@ -0,0 +1,212 @@
+from glob import glob
+from os.path import basename, dirname, getmtime, join, relpath
+import re
+import sqlite3
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    testing TEXT,
+    model TEXT,
+    corpus TEXT,
+    pretrained INTEGER,
+    epochs INTEGER,
+    window INTEGER,
+    size INTEGER,
+    correct INTEGER,
+    wrong INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS scores (
+    file INTEGER,
+    row INTEGER,
+    gap REAL,
+    gensim INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_testing ON files (testing);
+CREATE INDEX IF NOT EXISTS scores_file ON scores (file);
+"""
+
+AVERAGES = """
+SELECT files.path AS "File",
+    COALESCE(SUM(scores.gap > 0), 0) AS "Gap Score Correct",
+    COALESCE(SUM(scores.gensim = 1), 0) AS "Gensim Correct",
+    AVG(scores.gap) AS "Gap Score Average"
+FROM files LEFT JOIN scores ON scores.file = files.id
+WHERE files.testing = ?
+GROUP BY files.id
+ORDER BY files.path
+"""
+
+PARAMETER = re.compile(r"^(?:(?P<epochs>\d+)e|(?P<window>\d+)w|s(?P<size>\d+))$")
+
+
+def model_metadata(name):
+    """ Reads the corpus and the training parameters of a model from its name, as built by train.py
+
+    e.g. data.transformed.com-cut.Full.pretrained.1500e.10w.s80 is the model trained on data.transformed.com-cut.Full,
+    pretrained on the Greek corpus, for 1500 epochs with a window of 10 and vectors of size 80. Parameters missing from
+    the name are the gensim defaults the model was trained with (window 5, size 100).
+
+    :param name: the name of the model, without the .tsv extension
+    :type name: str
+    :return: the corpus, pretrained, epochs, window and size of the model
+    :rtype: dict
+    """
+    metadata = {"corpus": [], "pretrained": 0, "epochs": None, "window": 5, "size": 100}
+    for part in name.split("."):
+        match = PARAMETER.match(part)
+        if match:
+            metadata.update({key: int(value) for key, value in match.groupdict().items() if value is not None})
+        elif part == "pretrained":
+            metadata["pretrained"] = 1
+        elif metadata["epochs"] is None:
+            metadata["corpus"].append(part)
+    metadata["corpus"] = ".".join(metadata["corpus"])
+    return metadata
+
+
+def read_scores(file):
+    """ Reads the gap scores and the gensim outlier predictions of a .tsv file produced by Code.Evaluate.Evaluator
+
+    :param file: the path of the .tsv file
+    :type file: str
+    :return: the number of fitting and of alien words per testing group, and the (gap score, gensim prediction) of
+        each row, the prediction being None for files written without the Gensim columns
+    :rtype: (int, int, [(float, int)])
+    """
+    with open(file) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        gensim_col = header.index("Right Computer Outsider") if "Right Computer Outsider" in header else None
+        rows = []
+        for line in f:
+            line = line.rstrip("\n").split("\t")
+            if line == [""]:
+                continue
+            rows.append((float(line[0]), None if gensim_col is None else int(line[gensim_col] == "1")))
+    return header.count("IntraDomainWord"), header.count("ExtraDomainWord"), rows
+
+
+class ResultsStore(object):
+    """ SQLite store of the scores of every .tsv file produced by Code.Evaluate.Evaluator under a results directory
+
+    Files are parsed once, when they are new or modified, and tagged with their testing directory, the metadata of
+    their model (see model_metadata) and the size of their testing groups. The tables written by
+    Code.utils.results_eval.eval_tsv are then a query away.
+
+    :param path: the path of the SQLite database, ':memory:' for a store that is not saved
+    :type path: str
+    :param root: the directory containing one directory of .tsv files per testing configuration
+    :type root: str
+    """
+    def __init__(self, path, root="results"):
+        self.root = root
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def ingest(self):
+        """ Loads the .tsv files of the testing directories that changed since the last ingestion, and forgets the
+        ones that were removed
+
+        :return: the paths of the files loaded, relative to the root directory
+        :rtype: [str]
+        """
+        known = dict(self.connection.execute("SELECT path, mtime FROM files"))
+        paths = sorted(relpath(file, self.root) for file in glob(join(self.root, "*", "*.tsv")))
+        loaded = []
+        with self.connection:
+            for path in set(known) - set(paths):
+                self.forget(path)
+            for path in paths:
+                mtime = getmtime(join(self.root, path))
+                if known.get(path) == mtime:
+                    continue
+                self.forget(path)
+                self.load(path, mtime)
+                loaded.append(path)
+        return loaded
+
+    def forget(self, path):
+        """ Removes a file and its scores from the store
+
+        :param path: the path of the file, relative to the root directory
+        :type path: str
+        """
+        self.connection.execute("DELETE FROM scores WHERE file IN (SELECT id FROM files WHERE path = ?)", (path,))
+        self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def load(self, path, mtime):
+        """ Parses a file into the store
+
+        :param path: the path of the file, relative to the root directory
+        :type path: str
+        :param mtime: the modification time of the file
+        :type mtime: float
+        """
+        correct, wrong, rows = read_scores(join(self.root, path))
+        model = basename(path)[:-len(".tsv")]
+        metadata = model_metadata(model)
+        cursor = self.connection.execute(
+            "INSERT INTO files (path, testing, model, corpus, pretrained, epochs, window, size, correct, wrong, mtime) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, dirname(path), model, metadata["corpus"], metadata["pretrained"], metadata["epochs"],
+             metadata["window"], metadata["size"], correct, wrong, mtime)
+        )
+        self.connection.executemany(
+            "INSERT INTO scores (file, row, gap, gensim) VALUES (?, ?, ?, ?)",
+            ((cursor.lastrowid, row, gap, gensim) for row, (gap, gensim) in enumerate(rows))
+        )
+
+    def query(self, sql, parameters=()):
+        """ Runs an aggregation query over the files and scores tables
+
+        :param sql: the SQL query
+        :type sql: str
+        :param parameters: the parameters of the query
+        :type parameters: tuple
+        :rtype: pd.DataFrame
+        """
+        return pd.read_sql_query(sql, self.connection, params=parameters)
+
+    def averages(self, testing):
+        """ Computes, for each file of a testing directory, the table written by Code.utils.results_eval.eval_tsv
+
+        :param testing: the name of the testing directory, e.g. results_3_and_1
+        :type testing: str
+        :return: File, Gap Score Correct, Gensim Correct and Gap Score Average of each file, ordered by file
+        :rtype: pd.DataFrame
+        """
+        return self.query(AVERAGES, (testing,))
+
+    def write_averages(self, testing, dest):
+        """ Saves the averages of a testing directory as a .tsv file in the format of Code.utils.results_eval.eval_tsv
+
+        :param testing: the name of the testing directory
+        :type testing: str
+        :param dest: the path of the .tsv file
+        :type dest: str
+        """
+        self.averages(testing).to_csv(dest, sep="\t", index=False)
+
+    def summary(self, by=("testing", "corpus", "pretrained", "window", "size")):
+        """ Aggregates the scores of the models over some of their metadata
+
+        :param by: the columns of the files table to group by
+        :type by: tuple
+        :return: the number of files and testing groups, the share of positive gap scores and of right gensim
+            predictions and the mean gap score of each group
+        :rtype: pd.DataFrame
+        """
+        columns = ", ".join("files.{}".format(column) for column in by)
+        return self.query(
+            "SELECT {columns}, COUNT(DISTINCT files.id) AS files, COUNT(scores.gap) AS groups, "
+            "AVG(scores.gap > 0) AS gap_correct, AVG(scores.gensim) AS gensim_correct, AVG(scores.gap) AS gap_average "
+            "FROM files JOIN scores ON scores.file = files.id GROUP BY {columns} ORDER BY {columns}".format(
+                columns=columns
+            )
+        )
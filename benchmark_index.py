@@ -0,0 +1,44 @@
+from Code.WtoVec import W2VModel
+from Code.WtoVec.index import recall
+from argparse import ArgumentParser
+from os.path import basename, dirname
+import numpy as np
+
+
+def run(model, queries=1000, k=10, probes=None, lists=None, rebuild=False, seed=0):
+    """ Report the recall@k and the speed of the approximate nearest-neighbour index of a saved model against an exact
+    scan, building the index first if needed
+
+    :param model: Path to the model file
+    :param queries: Number of query words, drawn at random from the vocabulary
+    :param k: Number of neighbours compared
+    :param probes: Numbers of lists scanned to compare
+    :param lists: Number of lists of the index, when it is built
+    :param rebuild: Build the index even if one is saved for the model
+    :param seed: Seed of the choice of the query words
+    :return: List of (probe, recall@k, seconds per query)
+    """
+    if probes is None:
+        probes = [1, 2, 4, 8, 16]
+    w2vec = W2VModel(basename(model).replace(".model", ""), dirname(model))
+    w2vec.load()
+    if rebuild or w2vec.index is None:
+        w2vec.build_index(lists=lists)
+    rows = np.random.RandomState(seed).choice(len(w2vec.index2word), min(queries, len(w2vec.index2word)), replace=False)
+    results = recall(w2vec.index, w2vec.vectors, rows, k=k, probes=probes)
+    print("Probe\tRecall@{}\tMilliseconds per query".format(k))
+    for probe, found, seconds in results:
+        print("{}\t{:.4f}\t{:.3f}".format("exact" if probe is None else probe, found, seconds * 1000))
+    return results
+
+
+parser = ArgumentParser()
+parser.add_argument("model", help="Path to the model file")
+parser.add_argument("--queries", dest="queries", default=1000, type=int, help="Number of query words")
+parser.add_argument("--k", dest="k", default=10, type=int, help="Number of neighbours compared")
+parser.add_argument("--probes", dest="probes", default=[1, 2, 4, 8, 16], nargs="+", type=int, help="Numbers of lists scanned")
+parser.add_argument("--lists", dest="lists", default=None, type=int, help="Number of lists of the index (Default: square root of the vocabulary size)")
+parser.add_argument("--rebuild", dest="rebuild", action="store_true", default=False, help="Rebuild the saved index")
+
+if __name__ == "__main__":
+    run(**vars(parser.parse_args()))
@@ -1,7 +1,15 @@
 from Code.BuildCorpus.Bible.build import BuildBible
 from Code.BuildCorpus.Greek import BuildGreek
+from argparse import ArgumentParser
 
 
-#build = BuildBible()
-greek = BuildGreek(["data/original/training-pandora-tb-grc/transition"], "data/transformed/training-pandora-tb-grc")
-greek.run()
+parser = ArgumentParser()
+parser.add_argument("--jobs", dest="jobs", default=1, type=int, help="Number of processes reading source files")
+parser.add_argument("--full", dest="incremental", action="store_false", default=True, help="Rebuild every source file, not only the changed ones")
+parser.add_argument("--packed", dest="packed", action="store_true", default=False, help="Also write the packed corpora read by train.py --packed")
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    #build = BuildBible()
+    greek = BuildGreek(["data/original/training-pandora-tb-grc/transition"], "data/transformed/training-pandora-tb-grc")
+    greek.run(**args)
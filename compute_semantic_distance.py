@@ -1,138 +1,258 @@
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import pairwise_distances
 import math
+from scipy import sparse
+from Code.utils.matrix import SignificanceMatrix, SparseSignificanceMatrix, cosines
+
+
+def own_similarities(dots, squares, center_squares):
+    """ Cosine similarity of each row with its domain center computed without the row itself, ((center * 10) - row) / 9,
+        from the dot product of the row with its center and their squared norms only, so that neither the centers of
+        the rows nor the centers without the rows are ever built
+
+    :param dots: the dot product of each row with the center of its domain
+    :type dots: np.ndarray
+    :param squares: the squared norm of each row
+    :type squares: np.ndarray
+    :param center_squares: the squared norm of the center of the domain of each row
+    :type center_squares: np.ndarray
+    :rtype: np.ndarray
+    """
+    without = np.sqrt(np.maximum(100 * center_squares - 20 * dots + squares, 0))
+    norms = np.sqrt(squares) * without
+    norms[norms == 0] = np.inf
+    return (10 * dots - squares) / norms
+
 
 class ComputeDistance:
 
-    def __init__(self, arr, ind, path):
+    def __init__(self, arr, ind, path, chunk_size=1024):
         """
 
-        :param arr: the array from which the co-occurrence statistical significance scores (e.g., LL) will be drawn
-        :type arr: np.ndarray or np.memmap
-        :param ind: the index of words for arr
+        :param arr: the array from which the co-occurrence statistical significance scores (e.g., LL) will be drawn.
+            An np.memmap is read by chunks of rows, only for the rows of the domain words, and a sparse matrix is never
+            densified.
+        :type arr: np.ndarray or np.memmap or scipy.sparse.spmatrix or SignificanceMatrix
+        :param ind: the index of words for arr (ignored if arr is a SignificanceMatrix)
         :type ind: list
         :param path: the path of the pickled dictionary of the semantic sub-domains and the words in those domains
         :type path: str
+        :param chunk_size: the number of rows of arr read at once
+        :type chunk_size: int
         """
 
         self.domains = pd.read_pickle(path)
-        self.sig = pd.DataFrame(arr, index=ind, columns=ind)
+        if isinstance(arr, SignificanceMatrix):
+            self.matrix = arr
+        elif sparse.issparse(arr):
+            self.matrix = SparseSignificanceMatrix(arr, ind, chunk_size=chunk_size)
+        else:
+            self.matrix = SignificanceMatrix(arr, ind, chunk_size=chunk_size)
+        self.sig = self.matrix.arr
+        self.index = self.matrix.index
         self.domain_averages = {}
         self.scores = {}
 
+    def domain_rows(self, words):
+        """ Maps the words of a domain to their rows in self.sig, reporting the words that are not in the index
+
+        :param words: the words of the domain
+        :type words: list
+        :return: the words found and their row indices
+        :rtype: (list, np.ndarray)
+        """
+        found, rows = [], []
+        for word in words:
+            if word.lower() in self.index:
+                found.append(word)
+                rows.append(self.index[word.lower()])
+            else:
+                print(word.lower())
+        return found, np.array(rows, dtype=np.int64)
+
+    def all_domain_rows(self):
+        """ Maps the words of every domain to their rows
+
+        :return: the words found, their row indices and the position of their domain in self.domains
+        :rtype: (list, np.ndarray, np.ndarray)
+        """
+        words, rows, owners = [], [], []
+        for position, domain in enumerate(self.domains.keys()):
+            found, found_rows = self.domain_rows(self.domains[domain])
+            words += found
+            rows.append(found_rows)
+            owners += [position] * len(found)
+        return words, np.concatenate(rows), np.array(owners, dtype=np.int64)
+
+    def gather(self, rows):
+        """ Reads the significance vectors of rows as a float64 matrix, sparse for a sparse backend
+
+        :param rows: the row indices
+        :type rows: np.ndarray
+        :rtype: np.ndarray or scipy.sparse.csr_matrix
+        """
+        return self.matrix.gather(rows)
+
     def calc_centers(self):
         """ Calculates one vector representing the center of each sub-domain by taking the mean of the word cooccurrence significance vectors
 
         """
+        domains = list(self.domains.keys())
+        _, rows, owners = self.all_domain_rows()
+        sums = np.zeros((len(domains), self.sig.shape[1]))
+        for positions, block in self.matrix.chunks(rows):
+            membership = (owners[positions][None, :] == np.arange(len(domains))[:, None]).astype(np.float64)
+            if sparse.issparse(block):
+                sums += block.T.dot(membership.T).T
+            else:
+                sums += np.dot(membership, block)
+        for position in np.unique(owners):
+            self.domain_averages[domains[position]] = sums[position] / len(self.domains[domains[position]])
 
-        for domain, words in self.domains.items():
-            for word in words:
-                try:
-                    summed_score += self.sig.ix[word.lower(), :]
-                except KeyError as E:
-                    print(word.lower())
-                except:
-                    summed_score = self.sig.ix[word.lower(), :]
-            self.domain_averages[domain] = summed_score/len(words)
-            summed_score = None
+    def similarities(self):
+        """ Calculates the cosine similarity of each word with each domain center.
+            For its own domain, the center is computed without the word itself.
+
+        :return: the words and their similarities, the first column being the similarity with the word's own domain and
+            the others the similarities with the other domains, in the order of self.domains. Domains without a center
+            (none of their words in the index) are skipped.
+        :rtype: (list, np.ndarray)
+        """
+        centered = np.array([domain in self.domain_averages for domain in self.domains.keys()], dtype=bool)
+        domains = [domain for domain, kept in zip(self.domains.keys(), centered) if kept]
+        centers = np.vstack([self.domain_averages[domain] for domain in domains])
+        center_squares = (centers ** 2).sum(axis=1)
+        center_norms = np.sqrt(center_squares)
+        words, rows, owners = self.all_domain_rows()
+        # Positions of the domains in self.domains mapped to their positions in domains
+        owners = (np.cumsum(centered) - 1)[owners]
+
+        sims = np.empty((len(words), len(domains)))
+        for positions, block in self.matrix.chunks(rows):
+            own = owners[positions]
+            lines = np.arange(len(own))
+            dots = np.asarray(block.dot(centers.T))
+            if sparse.issparse(block):
+                squares = np.asarray(block.multiply(block).sum(axis=1)).ravel()
+            else:
+                squares = (block ** 2).sum(axis=1)
+            norms = np.sqrt(squares)[:, None] * center_norms[None, :]
+            norms[norms == 0] = np.inf
+            all_sims = dots / norms
+            others = np.ones(all_sims.shape, dtype=bool)
+            others[lines, own] = False
+            sims[positions, 0] = own_similarities(dots[lines, own], squares, center_squares[own])
+            sims[positions, 1:] = all_sims[others].reshape(len(own), len(domains) - 1)
+        return words, sims
 
     def score_calc(self):
         """ Calculates the mean similarity of each word with each domain
             similarities[0] will always be the similarity score of a word with its proper domain
 
         """
-        similarities = []
-        for domain, words in self.domains.items():
-            for word in words:
-                y = ((self.domain_averages[domain] * 10) - self.sig.ix[word.lower(), :]) / 9
-                first = 1 - pairwise_distances(y.reshape(1, -1), self.sig.ix[word.lower(), :].reshape(1, -1),
-                                               metric='cosine')[0][0]
-                s = [first]
-                for domain2 in self.domains.keys():
-                    if domain2 != domain:
-                        other = self.domain_averages[domain2]
-                        s.append(1 -
-                                 pairwise_distances(other.reshape(1, -1), self.sig.ix[word.lower(), :].reshape(1, -1),
-                                                    metric='cosine')[0][0])
-                similarities.append({word: s})
-        self.record_scores(similarities)
-
-    def record_scores(self, sims):
+        self.record_scores(*self.similarities())
+
+    def ranks(self, sims):
+        """ Ranks the similarity of each word with its own domain among its similarities with all domains
+
+        :param sims: the similarities from self.similarities(), own domain first
+        :type sims: np.ndarray
+        :return: the rank of each word, 0 being the best
+        :rtype: np.ndarray
+        """
+        return (sims[:, 1:] > sims[:, :1]).sum(axis=1)
+
+    def record_scores(self, words, sims):
         """ records which words are closest to their proper domain as opposed to any other domain
 
+        :param words: the words scored
+        :type words: list
         :param sims: the similarity scores of a word with all semantic domains
-        :type sims: list
+        :type sims: np.ndarray
         """
-        for x in sims:
-            for word, v in x.items():
-                if max(v) == v[0]:
-                    self.scores[word] = 1
+        for word, rank in zip(words, self.ranks(sims)):
+            if rank == 0:
+                self.scores[word] = 1
 
 
 class CrossDomainAccuracy(ComputeDistance):
 
-    def record_scores(self, sims):
+    def record_scores(self, words, sims):
         """ records math.e ** (the rank of each word's similarity score) with its domain when compared to its scores to the other domains
             E.g., if its rank with its own domain is 2, this records the value math.e ** 2 for that word.
             To finish the calculation of the Cross-Domain Accuracy, the values here need to be put into the equation
             1 / score ** ρ, where ρ is the constant chosen to weight misattribution.
+            The ranks themselves are kept in self.word_ranks for SemDomainAttribAccuracySweep.
 
+        :param words: the words scored
+        :type words: list
         :param sims: the similarity scores of a word with all semantic domains
-        :type sims: list
+        :type sims: np.ndarray
         """
-        for x in sims:
-            for word, v in x.items():
-                ranked = sorted(v, reverse=True)
-                self.scores[word] = math.e ** ranked.index(v[0])
+        self.word_ranks = {}
+        for word, rank in zip(words, self.ranks(sims)):
+            self.word_ranks[word] = int(rank)
+            self.scores[word] = math.e ** int(rank)
 
 
 class SameDomainAccuracy(ComputeDistance):
 
-    def __init__(self, arr, ind, path, delta=1.0):
+    def __init__(self, arr, ind, path, delta=1.0, chunk_size=1024):
         """
 
         :param arr: the array from which the co-occurrence statistical significance scores (e.g., LL) will be drawn
-        :type arr: np.ndarray or np.memmap
-        :param ind: the index of words for arr
+        :type arr: np.ndarray or np.memmap or SignificanceMatrix
+        :param ind: the index of words for arr (ignored if arr is a SignificanceMatrix)
         :type ind: list
         :param path: the path of the pickled dictionary of the semantic sub-domains and the words in those domains
         :type path: str
+        :param chunk_size: the number of rows of arr read at once
+        :type chunk_size: int
         """
 
-        self.domains = pd.read_pickle(path)
-        self.sig = pd.DataFrame(arr, index=ind, columns=ind)
-        self.domain_averages = {}
-        self.scores = {}
+        ComputeDistance.__init__(self, arr, ind, path, chunk_size=chunk_size)
         self.Delta = delta
 
+    def similarity(self, word1, word2):
+        """ Cosine similarity between the significance vectors of two words
+
+        :raises KeyError: if one of the words is not in the index
+        :rtype: float
+        """
+        return float(cosines(self.gather(np.array([self.index[word1.lower()], self.index[word2.lower()]])))[0, 1])
+
     def score_calc(self):
         """ Calculates the Same-Domain Accuracy using the formula 1 - (Σ(i=1, m(k(l))) ((Δ - sim(w(i), w(n)))**2)/m(k(l)))
-            Note: the sklearn.metrics.pairwise.pairwise_distances function using metric="cosine" == 1 - CosSim
+            The rows of each domain are read once and all their cosine similarities computed as one Gram matrix.
+            Words missing from the index are reported once per domain and not scored.
 
         """
 
         for domain, words in self.domains.items():
-            for word in words:
-                summed_score = 0
-                for word2 in words:
-                    if word2 != word:
-                        try:
-                            summed_score += (self.Delta - (1 - pairwise_distances(
-                                self.sig.ix[word2.lower(), :].reshape(1, -1),
-                                self.sig.ix[word.lower(), :].reshape(1, -1),
-                                metric='cosine'
-                            )[0][0]))**2
-                        except KeyError as E:
-                            print(word.lower(), word2.lower())
-                        except:
-                            summed_score = (self.Delta - (1 - pairwise_distances(
-                                self.sig.ix[word2.lower(), :].reshape(1, -1),
-                                self.sig.ix[word.lower(), :].reshape(1, -1),
-                                metric='cosine'
-                            )[0][0]))**2
+            found, rows = self.missing_reported(domain, words)
+            if not found:
+                continue
+            gram = cosines(self.gather(rows))
+            labels = np.array(found, dtype=object)
+            others = labels[:, None] != labels[None, :]
+            summed_scores = (((self.Delta - gram) ** 2) * others).sum(axis=1)
+            for word, summed_score in zip(found, summed_scores):
                 self.scores[word] = 1 - (summed_score / len(words)-1)
 
+    def missing_reported(self, domain, words):
+        """ Maps the words of a domain to their rows, printing the missing words on one line
+
+        :param domain: the name of the domain
+        :param words: the words of the domain
+        :return: the words found and their row indices
+        :rtype: (list, np.ndarray)
+        """
+        found = [word for word in words if word.lower() in self.index]
+        missing = [word.lower() for word in words if word.lower() not in self.index]
+        if missing:
+            print(domain, "missing:", ", ".join(missing))
+        return found, np.array([self.index[word.lower()] for word in found], dtype=np.int64)
+
 def SemDomainAttribAccuracy(CDD, SDD, alpha=1, rho=1):
     """ computes the Semantic Domain Attribution Accuracy Score
         alpha: 0 <= alpha <= 2, a value of 1 balances between CDD and SDD, >1 SDD is more important, <1 CDD is more important
@@ -160,4 +280,41 @@ def SemDomainAttribAccuracy(CDD, SDD, alpha=1, rho=1):
         except OverflowError as E:
             print(E, word, SDD[word], CDD[word])
 
-    return scores
\ No newline at end of file
+    return scores
+
+def SemDomainAttribAccuracySweep(ranks, SDD, alphas, rhos):
+    """ computes the Semantic Domain Attribution Accuracy Score of every word for every pair of (alpha, rho) at once
+        1 / CDD ** rho is computed as exp(-rho * rank), which cannot overflow whatever the rank.
+
+    :param ranks: the rank of each word with its own domain, 0 being the best (CrossDomainAccuracy.word_ranks)
+    :type ranks: {word: rank}
+    :param SDD: the SDD scores for each word
+    :type SDD: {word: score}
+    :param alphas: the values for weighting the importance of SDD and CDD, between 0 and 2
+    :type alphas: list
+    :param rhos: the values for weighting misattributions in CDD, greater than 0
+    :type rhos: list
+    :return: the words, their SDA scores as a (words, alphas, rhos) array and the mean, standard deviation, minimum,
+        median and maximum of the scores for each (alpha, rho)
+    :rtype: (list, np.ndarray, pd.DataFrame)
+    """
+    alphas, rhos = np.asarray(alphas, dtype=np.float64), np.asarray(rhos, dtype=np.float64)
+    assert (alphas >= 0).all(), "The value of alpha must be between 0 and 2"
+    assert (alphas <= 2).all(), "The value of alpha must be between 0 and 2"
+    assert (rhos > 0).all(), "The value of rho must be greater than 0"
+
+    words = list(ranks.keys())
+    rank = np.array([ranks[word] for word in words], dtype=np.float64)
+    sdd = np.array([SDD[word] for word in words], dtype=np.float64)
+    cdd = np.exp(-rank[:, None] * rhos[None, :])
+    scores = ((alphas[None, :, None] * sdd[:, None, None]) + ((2 - alphas)[None, :, None] * cdd[:, None, :])) / 2
+
+    summary = pd.DataFrame({
+        'mean': scores.mean(axis=0).ravel(),
+        'std': scores.std(axis=0).ravel(),
+        'min': scores.min(axis=0).ravel(),
+        'median': np.median(scores, axis=0).ravel(),
+        'max': scores.max(axis=0).ravel()
+    }, index=pd.MultiIndex.from_product([alphas, rhos], names=['alpha', 'rho']),
+        columns=['mean', 'std', 'min', 'median', 'max'])
+    return words, scores, summary
@@ -0,0 +1,50 @@
+from Code.Cooccurrence import Cooccurrences, MEASURES
+from Code.utils.matrix import SignificanceMatrix
+from argparse import ArgumentParser
+from os.path import isdir
+from os import makedirs
+
+
+def run(directory="data/transformed/com-cut/Full", window=5, min_count=1, measure="ll", jobs_count=1, output=None,
+        dense=False):
+    """ Build the co-occurrence significance matrix of a corpus
+
+    The matrix is saved with its index at @output + ".index.txt", as a SparseSignificanceMatrix or, with @dense, as a
+    SignificanceMatrix in @output + ".npy", both of which can be memory-mapped and passed to ComputeDistance or
+    Evaluator.
+
+    :param directory: Corpus to read
+    :param window: Maximum distance between two co-occurring tokens
+    :param min_count: Minimum number of occurrences of a word to be counted
+    :param measure: Significance measure, "ll" or "ppmi"
+    :param jobs_count: Number of processes counting the corpus
+    :param output: Path of the matrix, without extension (Default: models/<corpus>.<measure>.<window>w)
+    :param dense: Save a dense matrix
+    :return: Path of the matrix
+    """
+    if output is None:
+        if not isdir("models"):
+            makedirs("models")
+        output = "models/{}.{}.{}w".format(directory.replace("/", "."), measure, window)
+    cooccurrences = Cooccurrences(directory, window=window, min_count=min_count)
+    cooccurrences.count(jobs=jobs_count)
+    matrix = cooccurrences.significance(measure)
+    if dense:
+        SignificanceMatrix(matrix.arr.toarray(), matrix.ind).save(output + ".npy", output + ".index.txt")
+    else:
+        matrix.save(output, output + ".index.txt")
+    print("{} words, {} significant pairs saved to {}".format(len(matrix), matrix.arr.nnz, output))
+    return output
+
+
+parser = ArgumentParser()
+parser.add_argument("--corpus", dest="directory", default="data/transformed/com-cut/Full", help="Corpus to read")
+parser.add_argument("--window", dest="window", default=5, type=int, help="Maximum distance between two co-occurring words")
+parser.add_argument("--min-count", dest="min_count", default=1, type=int, help="Minimum number of occurrences of a word")
+parser.add_argument("--measure", dest="measure", default="ll", choices=sorted(MEASURES), help="Significance measure")
+parser.add_argument("--jobs", dest="jobs_count", default=1, type=int, help="Number of processes counting the corpus")
+parser.add_argument("--output", dest="output", default=None, help="Path of the matrix, without extension")
+parser.add_argument("--dense", dest="dense", action="store_true", default=False, help="Save a dense .npy matrix")
+
+if __name__ == "__main__":
+    run(**vars(parser.parse_args()))
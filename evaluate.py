@@ -0,0 +1,149 @@
+from Code.WtoVec import W2VModel
+from Code.Evaluate import Evaluator
+from Code.Evaluate.batch import BatchEvaluator
+from Code.BuildCorpus.Bible.test_grouping import CreateTestGroups
+from train import corpora, GREEK
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from os.path import basename, dirname, isdir, isfile, join
+from os import makedirs
+import json
+
+
+def model_directory(name, output_dir="models"):
+    """ Find the corpus a saved model was trained on
+
+    :param name: Name of the model
+    :param output_dir: Directory of the model
+    :return: Corpus directory, None if unknown
+    """
+    fingerprint = join(output_dir, name + ".fingerprint.json")
+    if isfile(fingerprint):
+        with open(fingerprint) as f:
+            return json.load(f)["directory"]
+    if name.startswith("greek."):
+        return [GREEK, corpora()[0]]
+    for directory in corpora():
+        if name.startswith(directory.replace("/", ".")):
+            return directory
+    return None
+
+
+def result_name(name, directory):
+    """ Name of the evaluation file of a model, as written by train.run
+
+    :param name: Name of the model
+    :param directory: Corpus directory of the model
+    :return: Name of the .tsv file
+    """
+    corpus = directory.replace("/", ".")
+    if name.startswith(corpus) and not name.startswith(corpus + "."):
+        name = corpus + "." + name[len(corpus):]
+    return name + ".tsv"
+
+
+def evaluate_model(name, directory, output_dir, statistics, testings, batched=False, nomatch=False, vectors=False,
+                   probe=None):
+    """ Evaluate one saved model against several testing files
+
+    :param name: Name of the model
+    :param directory: Corpus directory of the model
+    :param output_dir: Directory of the model
+    :param statistics: Statistics of the corpus shared between the models trained on it
+    :type statistics: CorpusStatistics
+    :param testings: List of (testing groups, evaluation directory)
+    :param batched: Evaluate with the BatchEvaluator
+    :param nomatch: Compute match over four words using gensim
+    :param vectors: Evaluate the exported vectors of the model, exporting them first if needed
+    :param probe: Find neighbours through the approximate nearest-neighbour index of the model, scanning @probe lists,
+        building the index first if needed
+    :return: Name of the model
+    """
+    model = W2VModel(name, directory, output_dir=output_dir, probe=probe)
+    if vectors:
+        if not model.is_exported():
+            model.load()
+            model.export()
+        model.load(vectors=True)
+    else:
+        model.load(mmap="r")
+    if probe is not None and model.index is None:
+        model.build_index()
+    if statistics is not None:
+        model.statistics = statistics
+    evaluator = BatchEvaluator if batched else Evaluator
+    for test_data, evaluation_dir in testings:
+        evaluator(model, test_data).score(join(evaluation_dir, result_name(name, directory)), nomatch=nomatch)
+    return name
+
+
+def run(models="models/*.model", testing_files=None, evaluation_dirs=None, jobs_count=1, batched=False, nomatch=False,
+        vectors=False, probe=None):
+    """ Evaluate many saved models against many testing files in one process pool
+
+    Testing groups are parsed once and corpus statistics are computed or loaded once per corpus.
+
+    :param models: Glob of the saved models
+    :param testing_files: Files to evaluate against
+    :param evaluation_dirs: Where to save evaluation, one directory per testing file
+    :param jobs_count: Number of models evaluated at once
+    :param batched: Evaluate with the BatchEvaluator
+    :param nomatch: Compute match over four words using gensim
+    :param vectors: Evaluate the exported vectors of the models, exporting them first if needed
+    :param probe: Find neighbours through the approximate nearest-neighbour index of the models, scanning @probe lists
+    """
+    if testing_files is None:
+        testing_files = ["data/testing_groups.txt"]
+    if evaluation_dirs is None:
+        evaluation_dirs = ["results"]
+    if len(testing_files) != len(evaluation_dirs):
+        raise ValueError("One evaluation directory is needed per testing file")
+    for evaluation_dir in evaluation_dirs:
+        if not isdir(evaluation_dir):
+            makedirs(evaluation_dir)
+    testings = [
+        (CreateTestGroups.load_TSV(testing_file), evaluation_dir)
+        for testing_file, evaluation_dir in zip(testing_files, evaluation_dirs)
+    ]
+
+    selected = []
+    for path in sorted(glob(models)):
+        name, output_dir = basename(path)[:-len(".model")], dirname(path)
+        directory = model_directory(name, output_dir)
+        if directory is None:
+            print("{} has no known corpus, skipping".format(name))
+        elif isinstance(directory, list):
+            print("{} is a base model, skipping".format(name))
+        else:
+            selected.append((name, directory, output_dir))
+
+    shared = {}
+    for name, directory, output_dir in selected:
+        if directory not in shared:
+            shared[directory] = W2VModel(name, directory, output_dir=output_dir).statistics
+
+    with ProcessPoolExecutor(max_workers=jobs_count) as executor:
+        futures = [
+            executor.submit(
+                evaluate_model, name, directory, output_dir, shared[directory], testings,
+                batched=batched, nomatch=nomatch, vectors=vectors, probe=probe
+            )
+            for name, directory, output_dir in selected
+        ]
+        for future in futures:
+            print("{} evaluated".format(future.result()))
+
+
+parser = ArgumentParser()
+parser.add_argument("--models", dest="models", default="models/*.model", help="Glob of the models to evaluate")
+parser.add_argument("--testing", dest="testing_files", nargs="+", default=["data/testing_groups.txt"], help="Files to test against")
+parser.add_argument("--evdir", dest="evaluation_dirs", nargs="+", default=["results"], help="Directory for output, one per testing file")
+parser.add_argument("--jobs", dest="jobs_count", default=1, type=int, help="Number of models to evaluate at once")
+parser.add_argument("--batched", dest="batched", action="store_true", default=False, help="Compute all neighbours of the testing words at once")
+parser.add_argument("--no-match", dest="nomatch", action="store_true", default=False, help="Compute match over four words using gensim")
+parser.add_argument("--vectors", dest="vectors", action="store_true", default=False, help="Evaluate the exported, memory-mapped vectors of the models")
+parser.add_argument("--probe", dest="probe", default=None, type=int, help="Find neighbours through an approximate index, scanning N lists (Default: exact)")
+
+if __name__ == "__main__":
+    run(**vars(parser.parse_args()))
@@ -0,0 +1,32 @@
+from Code.utils.results_store import ResultsStore
+from argparse import ArgumentParser
+from os.path import join
+
+
+def run(store="results/results.sqlite", root="results", averages=None, output="results_analysis"):
+    """ Load the evaluation files of the models into the results store and write the averages of testing directories
+
+    :param store: Path of the SQLite database
+    :param root: Directory containing one directory of evaluation files per testing configuration
+    :param averages: Testing directories whose averages are written, e.g. results_3_and_1 is written to
+        averages_3_and_1.tsv
+    :param output: Directory of the averages
+    """
+    results = ResultsStore(store, root)
+    loaded = results.ingest()
+    print("{} files loaded".format(len(loaded)))
+    for testing in averages or []:
+        dest = join(output, "averages{}.tsv".format(testing[len("results"):]))
+        results.write_averages(testing, dest)
+        print("{} written".format(dest))
+    results.close()
+
+
+parser = ArgumentParser()
+parser.add_argument("--store", dest="store", default="results/results.sqlite", help="Path of the results store")
+parser.add_argument("--root", dest="root", default="results", help="Directory of the testing directories")
+parser.add_argument("--averages", dest="averages", nargs="*", default=None, help="Testing directories to write the averages of")
+parser.add_argument("--output", dest="output", default="results_analysis", help="Directory of the averages")
+
+if __name__ == "__main__":
+    run(**vars(parser.parse_args()))
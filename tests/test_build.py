@@ -0,0 +1,110 @@
+from unittest import TestCase
+from glob import glob
+from os import makedirs, remove, utime
+from os.path import getmtime, isdir, isfile, join
+from tempfile import TemporaryDirectory
+import json
+from Code.BuildCorpus.Bible.build import BuildBible
+from Code.BuildCorpus.Greek import BuildGreek
+
+
+def source(book, chapters):
+    return "\n".join(
+        '<w id="{}.{}.{}.{}" lem="{}{}">x</w>'.format(book, chapter, verse, word, book.lower(), word)
+        for chapter in range(1, chapters + 1) for verse in range(1, 3) for word in range(3)
+    )
+
+
+class TestIncrementalBibleBuild(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.src = join(self.directory.name, "src", "NT")
+        makedirs(self.src)
+        for book in ["Mark", "Matt"]:
+            with open(join(self.src, book + ".txt"), "w") as f:
+                f.write(source(book, 2))
+        self.out = join(self.directory.name, "out")
+        self.dests = {level: join(self.out, level) for level in ["corpus", "book", "chapter"]}
+        self.builder().run()
+        self.age()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def builder(self):
+        return BuildBible([self.src], self.dests)
+
+    def outputs(self):
+        return sorted(glob(join(self.out, "**", "*.txt"), recursive=True))
+
+    def age(self):
+        """ Dates every output back, so that the outputs written by the next build are told apart """
+        for path in self.outputs():
+            utime(path, (0, 0))
+
+    def written(self):
+        return [path for path in self.outputs() if getmtime(path) != 0]
+
+    def test_unchanged(self):
+        self.builder().run(incremental=True)
+        self.assertEqual(self.written(), [])
+
+    def test_modified_source(self):
+        with open(join(self.src, "Mark.txt"), "w") as f:
+            f.write(source("Mark", 3))
+        self.builder().run(incremental=True)
+        written = self.written()
+        self.assertIn(join(self.dests["chapter"], "NT", "Mark", "3.txt"), written)
+        self.assertIn(join(self.dests["corpus"], "NT.txt"), written)
+        self.assertFalse([path for path in written if "Matt" in path])
+
+    def test_deleted_output(self):
+        output = join(self.dests["chapter"], "NT", "Matt", "2.txt")
+        remove(output)
+        self.builder().run(incremental=True)
+        self.assertTrue(isfile(output))
+
+    def test_removed_source(self):
+        remove(join(self.src, "Matt.txt"))
+        self.builder().run(incremental=True)
+        self.assertFalse([path for path in self.outputs() if "Matt" in path])
+        self.assertFalse(isdir(join(self.dests["chapter"], "NT", "Matt")))
+        self.assertTrue(isfile(join(self.dests["book"], "NT", "Mark.txt")))
+
+        remove(join(self.src, "Mark.txt"))
+        self.builder().run(incremental=True)
+        self.assertEqual(self.outputs(), [])
+        # Destinations are emptied, not deleted
+        for dest in self.dests.values():
+            self.assertTrue(isdir(dest))
+
+    def test_new_builder_version(self):
+        self.addCleanup(setattr, BuildBible, "VERSION", BuildBible.VERSION)
+        BuildBible.VERSION += 1
+        self.builder().run(incremental=True)
+        self.assertEqual(self.written(), self.outputs())
+
+
+class TestIncrementalGreekBuild(TestCase):
+    def test_shadowed_source(self):
+        with TemporaryDirectory() as directory:
+            src, out = join(directory, "src"), join(directory, "out")
+            for folder, lemma in [("a", "alpha"), ("b", "beta")]:
+                makedirs(join(src, folder))
+                with open(join(src, folder, "x.tab"), "w") as f:
+                    f.write("1\t{}\t{}\tx\n".format(lemma, lemma))
+            builder = BuildGreek([src], out)
+            builder.run()
+            output = join(out, "x.tab.txt")
+            winner, survivor = builder.filenames[-1], builder.filenames[0]
+            with open(output) as f:
+                self.assertEqual(f.read(), "alpha" if winner.endswith("a/x.tab") else "beta")
+
+            remove(winner)
+            BuildGreek([src], out).run(incremental=True)
+            with open(output) as f:
+                self.assertEqual(f.read(), "alpha" if survivor.endswith("a/x.tab") else "beta")
+            with open(join(out, ".manifest.json")) as f:
+                sources = json.load(f)["sources"]
+            self.assertEqual(set(sources), {survivor})
+            self.assertEqual(sources[survivor]["outputs"], [output])
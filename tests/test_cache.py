@@ -0,0 +1,39 @@
+from unittest import TestCase
+from os.path import join
+from tempfile import TemporaryDirectory
+from Code.WtoVec.cache import NeighbourCache
+
+
+class TestNeighbourCache(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = join(self.directory.name, "model.neighbours.pickle")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_eviction(self):
+        cache = NeighbourCache(self.path, "v1", max_size=2)
+        cache.put("a", [("b", 0.5)])
+        cache.put("b", [("a", 0.5)])
+        # Reading "a" makes "b" the least recently used word
+        self.assertEqual(cache.get("a", 1), [("b", 0.5)])
+        cache.put("c", [("a", 0.25)])
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertIsNone(cache.get("a", 2))
+
+    def test_save_and_reload(self):
+        cache = NeighbourCache(self.path, "v1")
+        cache.put("a", [("b", 0.5), ("c", 0.25)])
+        cache.save()
+        reloaded = NeighbourCache(self.path, "v1")
+        self.assertEqual(reloaded.get("a", 2), [("b", 0.5), ("c", 0.25)])
+        self.assertFalse(reloaded.dirty)
+
+    def test_invalidated_by_key(self):
+        cache = NeighbourCache(self.path, "v1")
+        cache.put("a", [("b", 0.5)])
+        cache.save()
+        self.assertEqual(len(NeighbourCache(self.path, "v2")), 0)
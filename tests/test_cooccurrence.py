@@ -0,0 +1,30 @@
+from unittest import TestCase
+from os.path import join
+from tempfile import TemporaryDirectory
+from Code.Cooccurrence import Cooccurrences
+
+
+class TestCooccurrences(TestCase):
+    def test_counts_and_significance(self):
+        with TemporaryDirectory() as directory:
+            for i, text in enumerate(["a b c a", "b a rare c"]):
+                with open(join(directory, "{}.txt".format(i)), "w") as f:
+                    f.write(text)
+            cooccurrences = Cooccurrences(directory, window=1, min_count=2)
+            self.assertEqual(cooccurrences.index, ["a", "b", "c"])
+            counts = cooccurrences.count(jobs=2, chunk_size=1).toarray()
+            # "rare" is not counted but still separates "a" from "c"
+            self.assertEqual(counts.tolist(), [[0, 2, 1], [2, 0, 1], [1, 1, 0]])
+            ll = cooccurrences.significance("ll")
+            self.assertEqual(ll.index, {"a": 0, "b": 1, "c": 2})
+            self.assertGreater(ll.similarity("a", "b"), ll.similarity("a", "c"))
+            self.assertEqual(ll.similarity("a", "a"), 0)
+            self.assertRaises(ValueError, cooccurrences.significance, "dice")
+
+    def test_case_and_self_cooccurrences(self):
+        with TemporaryDirectory() as directory:
+            with open(join(directory, "0.txt"), "w") as f:
+                f.write("A a b")
+            cooccurrences = Cooccurrences(directory, window=1)
+            self.assertEqual(cooccurrences.index, ["a", "b"])
+            self.assertEqual(cooccurrences.count().toarray().tolist(), [[1, 1], [1, 0]])
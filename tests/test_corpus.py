@@ -0,0 +1,59 @@
+from unittest import TestCase
+from glob import glob
+from collections import Counter
+from os.path import join
+from tempfile import TemporaryDirectory
+from Code.WtoVec.corpus import StreamingCorpus, PackedCorpus, CorpusStatistics
+from Code.utils.packed import pack
+
+
+class TestStreamingCorpus(TestCase):
+    def setUp(self):
+        self.files = sorted(glob("data/transformed/training-pandora-tb-grc/*.txt"))[:5]
+        self.corpus = StreamingCorpus(self.files)
+
+    def test_reiterable(self):
+        first = list(self.corpus)
+        self.assertEqual(len(first), 5)
+        self.assertEqual(first, list(self.corpus))
+
+    def test_statistics(self):
+        occurences = Counter()
+        for file in self.files:
+            with open(file) as f:
+                occurences.update(f.read().split())
+        self.assertEqual(self.corpus.occurences, occurences)
+        self.assertEqual(self.corpus.tokens, sum(occurences.values()))
+        self.assertEqual(self.corpus.sentences, 5)
+
+
+class TestCorpusStatistics(TestCase):
+    def test_save_and_match(self):
+        with TemporaryDirectory() as directory:
+            files = []
+            for i, text in enumerate(["a b c", "a b", "a"]):
+                files.append(join(directory, "{}.txt".format(i)))
+                with open(files[-1], "w") as f:
+                    f.write(text)
+            statistics = StreamingCorpus(files, directory).statistics
+            self.assertEqual(statistics.occurences["a"], 3)
+            self.assertEqual(statistics.vocabulary, {"a", "b", "c"})
+            self.assertEqual((statistics.sentences, statistics.tokens), (3, 6))
+
+            statistics.save(join(directory, "stats.pickle"))
+            loaded = CorpusStatistics.load(join(directory, "stats.pickle"))
+            self.assertTrue(loaded.matches(directory, files))
+            self.assertFalse(loaded.matches(directory, files[:2]))
+            self.assertFalse(loaded.matches("elsewhere", files))
+
+
+class TestPackedCorpus(TestCase):
+    def test_same_as_streaming(self):
+        files = sorted(glob("data/transformed/training-pandora-tb-grc/*.txt"))[:5]
+        with TemporaryDirectory() as directory:
+            pack(files, join(directory, "corpus"))
+            corpus, streaming = PackedCorpus(join(directory, "corpus")), StreamingCorpus(files)
+            self.assertEqual(list(corpus), list(streaming))
+            self.assertEqual(len(corpus), 5)
+            self.assertEqual(corpus.occurences, streaming.occurences)
+            self.assertEqual((corpus.sentences, corpus.tokens), (streaming.sentences, streaming.tokens))
@@ -0,0 +1,37 @@
+from unittest import TestCase
+from os.path import join
+from tempfile import TemporaryDirectory
+from Code.BuildCorpus.Bible.test_grouping import CreateTestGroups
+
+
+class TestCreateTestGroups(TestCase):
+    def test_generate(self):
+        with TemporaryDirectory() as directory:
+            domains = {
+                "01 A One.txt": "a b c d", "01 B Two.txt": "e f g h", "02 A Three.txt": "i j k l",
+                "03 A Four.txt": "m n o p", "04 A Five.txt": "a q r s", "(93 A Six.txt": "t u v w"
+            }
+            for name, words in domains.items():
+                with open(join(directory, name), "w") as f:
+                    f.write(words)
+            groups = CreateTestGroups(directory, None)
+            names, _, valid = groups.valid_pairs()
+            first, five = names.index("01 A One.txt"), names.index("04 A Five.txt")
+            # Same parent domain, shared word "a" and "(93" first domains are all excluded
+            self.assertFalse(valid[first, names.index("01 B Two.txt")])
+            self.assertFalse(valid[first, five] or valid[five, first])
+            self.assertFalse(valid[names.index("(93 A Six.txt")].any())
+            self.assertTrue(valid[first, names.index("(93 A Six.txt")])
+
+            dest = join(directory, "Correct_{count_1}_Wrong_{count_2}.tsv")
+            written = groups.generate(dest, [(3, 1), (2, 2)], seed=1, count=10)
+            with open(written[(3, 1)]) as f:
+                content = f.read()
+            self.assertEqual(groups.generate(dest, [(3, 1)], seed=1, count=10)[(3, 1)], written[(3, 1)])
+            with open(written[(3, 1)]) as f:
+                self.assertEqual(f.read(), content)
+            loaded = CreateTestGroups.load_TSV(written[(3, 1)])
+            self.assertEqual(len(loaded), 10)
+            for fitting, alien in loaded:
+                self.assertEqual((len(set(fitting)), len(alien)), (3, 1))
+            self.assertRaises(ValueError, groups.generate, dest, [(5, 1)])
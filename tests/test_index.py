@@ -0,0 +1,32 @@
+from unittest import TestCase
+from os.path import join
+from tempfile import TemporaryDirectory
+import numpy as np
+from Code.WtoVec.index import InvertedFileIndex
+
+
+class TestInvertedFileIndex(TestCase):
+    def setUp(self):
+        vectors = np.random.RandomState(0).randn(300, 16)
+        self.vectors = vectors / np.sqrt((vectors ** 2).sum(axis=1, keepdims=True))
+        self.index = InvertedFileIndex.build(self.vectors, lists=8, key="v1")
+
+    def test_probing_every_list_is_exact(self):
+        for row in [0, 17, 299]:
+            scores = np.dot(self.vectors, self.vectors[row])
+            scores[row] = -np.inf
+            exact = np.argsort(-scores, kind="mergesort")[:10]
+            rows, similarities = self.index.search(
+                self.vectors, self.vectors[row], n=10, probe=len(self.index), exclude=[row]
+            )
+            self.assertEqual(rows.tolist(), exact.tolist())
+            np.testing.assert_allclose(similarities, scores[exact])
+
+    def test_load_checks_the_key(self):
+        with TemporaryDirectory() as directory:
+            path = join(directory, "model.ivf.npz")
+            self.index.save(path)
+            loaded = InvertedFileIndex.load(path, key="v1")
+            np.testing.assert_array_equal(loaded.order, self.index.order)
+            self.assertEqual(loaded.key, "v1")
+            self.assertIsNone(InvertedFileIndex.load(path, key="v2"))
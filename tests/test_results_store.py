@@ -0,0 +1,34 @@
+from unittest import TestCase
+from os import makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+from Code.utils.results_store import ResultsStore, model_metadata
+
+
+class TestResultsStore(TestCase):
+    def test_metadata(self):
+        self.assertEqual(
+            model_metadata("data.transformed.no-cut.Full.txt.pretrained.1500e.10w.s80"),
+            {"corpus": "data.transformed.no-cut.Full.txt", "pretrained": 1, "epochs": 1500, "window": 10, "size": 80}
+        )
+        self.assertEqual(model_metadata("data.transformed.NT.1500e")["window"], 5)
+
+    def test_averages(self):
+        with TemporaryDirectory() as root:
+            makedirs(join(root, "results_3_and_1"))
+            path = join(root, "results_3_and_1", "data.transformed.NT.1500e.s50.tsv")
+            with open(path, "w") as f:
+                f.write("\n".join([
+                    "Mean Gap Score Difference\tIntraDomainWord\tIntraDomainWord\tIntraDomainWord\tExtraDomainWord\t"
+                    "Gensim Computed Outsider\tRight Computer Outsider",
+                    "0.5\ta\tb\tc\td\td\t1",
+                    "-0.25\ta\tb\tc\td\tb\t0"
+                ]))
+            store = ResultsStore(":memory:", root)
+            self.assertEqual(store.ingest(), ["results_3_and_1/data.transformed.NT.1500e.s50.tsv"])
+            self.assertEqual(store.ingest(), [])
+            averages = store.averages("results_3_and_1")
+            self.assertEqual(
+                averages.values.tolist(), [["results_3_and_1/data.transformed.NT.1500e.s50.tsv", 1, 1, 0.125]]
+            )
+            self.assertEqual(store.query("SELECT correct, wrong, size FROM files").values.tolist(), [[3, 1, 50]])
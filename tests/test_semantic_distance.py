@@ -0,0 +1,96 @@
+from unittest import TestCase
+from os.path import join
+from tempfile import TemporaryDirectory
+import math
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from compute_semantic_distance import ComputeDistance, CrossDomainAccuracy, SameDomainAccuracy
+from Code.utils.matrix import SparseSignificanceMatrix
+
+
+def cosine(a, b):
+    return np.dot(a, b) / np.sqrt(np.dot(a, a) * np.dot(b, b))
+
+
+class TestDomainAccuracy(TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.ind = ["w{}".format(i) for i in range(40)]
+        self.arr = random.rand(40, 40)
+        self.arr[self.arr < 0.5] = 0
+        words = ["W{}".format(i) for i in random.permutation(40)]
+        self.domains = {
+            "one": words[:10], "two": words[10:20], "three": words[20:30],
+            "four": words[30:39] + ["missing"],
+            "ghost": ["absent", "nowhere"]
+        }
+        self.directory = TemporaryDirectory()
+        self.path = join(self.directory.name, "domains.pickle")
+        pd.to_pickle(self.domains, self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def row(self, word):
+        return self.arr[self.ind.index(word.lower())]
+
+    def centers(self):
+        """ Center of each domain with an indexed word, computed word by word as the original implementation did """
+        return {
+            domain: sum(self.row(w) for w in words if w.lower() in self.ind) / len(words)
+            for domain, words in self.domains.items() if any(w.lower() in self.ind for w in words)
+        }
+
+    def reference_ranks(self):
+        """ Rank of each word with its domain, computed word by word as the original implementation did """
+        centers = self.centers()
+        ranks = {}
+        for domain, center in centers.items():
+            for word in self.domains[domain]:
+                if word.lower() not in self.ind:
+                    continue
+                own = cosine((center * 10 - self.row(word)) / 9, self.row(word))
+                others = [cosine(other, self.row(word)) for name, other in centers.items() if name != domain]
+                ranks[word] = sum(other > own for other in others)
+        return ranks
+
+    def test_cross_domain_accuracy(self):
+        accuracy = CrossDomainAccuracy(self.arr, self.ind, self.path)
+        accuracy.calc_centers()
+        accuracy.score_calc()
+        ranks = self.reference_ranks()
+        self.assertEqual(accuracy.word_ranks, ranks)
+        for word, rank in ranks.items():
+            self.assertAlmostEqual(accuracy.scores[word], math.e ** rank)
+
+    def test_same_domain_accuracy(self):
+        accuracy = SameDomainAccuracy(self.arr, self.ind, self.path)
+        accuracy.score_calc()
+        expected = {}
+        for words in self.domains.values():
+            found = [w for w in words if w.lower() in self.ind]
+            for word in found:
+                summed = sum((1 - cosine(self.row(other), self.row(word))) ** 2 for other in found if other != word)
+                expected[word] = 1 - (summed / len(words) - 1)
+                self.assertAlmostEqual(accuracy.similarity(word, found[0]), cosine(self.row(word), self.row(found[0])))
+        self.assertEqual(set(accuracy.scores), set(expected))
+        for word, score in expected.items():
+            self.assertAlmostEqual(accuracy.scores[word], score)
+
+    def test_backends(self):
+        np.save(join(self.directory.name, "arr.npy"), self.arr)
+        backends = [
+            self.arr,
+            np.load(join(self.directory.name, "arr.npy"), mmap_mode="r"),
+            SparseSignificanceMatrix(sparse.csr_matrix(self.arr), self.ind, chunk_size=7)
+        ]
+        centers = self.centers()
+        for arr in backends:
+            distance = ComputeDistance(arr, self.ind, self.path, chunk_size=7)
+            distance.calc_centers()
+            words, sims = distance.similarities()
+            for word, similarity in zip(words, sims[:, 0]):
+                domain = [name for name, domain_words in self.domains.items() if word in domain_words][0]
+                center = centers[domain]
+                self.assertAlmostEqual(similarity, cosine((center * 10 - self.row(word)) / 9, self.row(word)))
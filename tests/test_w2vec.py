@@ -1,5 +1,9 @@
 from unittest import TestCase
+from os import makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
 from Code.WtoVec import W2VModel
+from Code.utils.packed import pack
 
 
 class TestW2Vec(TestCase):
@@ -15,4 +19,24 @@ class TestW2Vec(TestCase):
         self.assertIn(
             "Αδαμ Σηθ Ενως Καιναν Μαλελεηλ Ιαρεδ Ενωχ",
             sorted(self.HalfCut.sentences)[0]
-        )
\ No newline at end of file
+        )
+
+class TestFingerprint(TestCase):
+    def test_packed_corpus_changes(self):
+        with TemporaryDirectory() as directory:
+            corpus, models = join(directory, "corpus"), join(directory, "models")
+            makedirs(corpus)
+            with open(join(corpus, "0.txt"), "w") as f:
+                f.write("a b c")
+            pack([join(corpus, "0.txt")], corpus + ".packed")
+            model = W2VModel("packed", corpus, output_dir=models, packed=True)
+            with open(model.output, "w") as f:
+                f.write("")
+            model.write_fingerprint()
+            self.assertTrue(W2VModel("packed", corpus, output_dir=models, packed=True).is_up_to_date())
+
+            # Only the packed corpus changes, the text files being the same
+            with open(join(directory, "other.txt"), "w") as f:
+                f.write("c b a")
+            pack([join(directory, "other.txt")], corpus + ".packed")
+            self.assertFalse(W2VModel("packed", corpus, output_dir=models, packed=True).is_up_to_date())
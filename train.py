@@ -1,34 +1,26 @@
 from Code.WtoVec import W2VModel
-from Code.Evaluate import Evaluator
+from Code.Evaluate import Evaluator, EarlyStopping
+from Code.Evaluate.batch import BatchEvaluator
 from argparse import ArgumentParser
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from os import cpu_count
 
 EPOCHS = 1500
 WORKERS = 7
+GREEK = "data/transformed/training-pandora-tb-grc"
 
 simple_train = False  # When set to true, only train com-cut's + Greek
 pretrained_only = False  # Only train pretrained
 
+Job = namedtuple("Job", ["name", "directory", "params", "preload", "evaluation"])
 
-def run(
-        simple_train=False,
-        pretrained_only=False,
-        EPOCHS=1500,
-        WORKERS=7,
-        testing_file="data/testing_groups.txt",
-        evaluation_dir="results",
-        is_training=False,
-        nomatch=False
-):
-    """ Run training or evaluation
 
-    :param simple_train: Train only the Complete Cut Corpora
-    :param pretrained_only: Train only on the Greek pretrained
-    :param EPOCHS: Number of epochs
-    :param WORKERS: Number of workers
-    :param testing_file: File to evaluate against
-    :param evaluation_dir: Where to save evaluation
-    :param is_training: Set training to run
-    :return:
+def grid(WORKERS=7):
+    """ Parameter sets to train
+
+    :param WORKERS: Number of gensim workers per model
+    :return: List of (name, parameters)
     """
     basic_kwargs = [
         ("1500e", dict(min_count=1, workers=WORKERS)),
@@ -40,7 +32,15 @@ def run(
     kwargs += [(name+".s50", {**kw, **{"size": 50}}) for name, kw in basic_kwargs]
     kwargs += [(name + ".s30", {**kw, **{"size": 30}}) for name, kw in basic_kwargs]
     kwargs += [(name + ".s80", {**kw, **{"size": 80}}) for name, kw in basic_kwargs]
+    return kwargs
+
 
+def corpora(simple_train=False):
+    """ Corpora to train on
+
+    :param simple_train: Train only the Complete Cut Corpora
+    :return: List of corpus directories
+    """
     directories = [
         "data/transformed/com-cut/Full",
         "data/transformed/sup-cut/Full",
@@ -51,6 +51,65 @@ def run(
         directories = [
             "data/transformed/com-cut/Full"
         ]
+    return directories
+
+
+def stopping(held_out_file, testing_file, early_stopping=None):
+    """ Build a fresh early stopping criterion for a model
+
+    :param held_out_file: File of the held-out testing groups evaluated during training
+    :param testing_file: File the trained models are scored against, which cannot be the held-out one
+    :param early_stopping: Number of epochs between evaluations, None to train for all epochs
+    :rtype: EarlyStopping
+    """
+    if early_stopping is None:
+        return None
+    if held_out_file is None or held_out_file == testing_file:
+        raise ValueError("Early stopping needs a held-out testing file other than {}".format(testing_file))
+    return EarlyStopping(held_out_file, chunk=early_stopping)
+
+
+def run(
+        simple_train=False,
+        pretrained_only=False,
+        EPOCHS=1500,
+        WORKERS=7,
+        testing_file="data/testing_groups.txt",
+        evaluation_dir="results",
+        is_training=False,
+        nomatch=False,
+        streaming=False,
+        packed=False,
+        force=False,
+        checkpoint_epochs=None,
+        checkpoint_minutes=None,
+        early_stopping=None,
+        held_out_file=None,
+        batched=False
+):
+    """ Run training or evaluation
+
+    :param simple_train: Train only the Complete Cut Corpora
+    :param pretrained_only: Train only on the Greek pretrained
+    :param EPOCHS: Number of epochs
+    :param WORKERS: Number of workers
+    :param testing_file: File to evaluate against
+    :param evaluation_dir: Where to save evaluation
+    :param is_training: Set training to run
+    :param streaming: Read the corpora lazily instead of keeping them in memory
+    :param packed: Read the packed corpora written by the corpus builders
+    :param force: Retrain models even when their saved version is up to date
+    :param checkpoint_epochs: Save a training checkpoint every N epochs
+    :param checkpoint_minutes: Save a training checkpoint every N minutes
+    :param early_stopping: Evaluate every N epochs on held-out testing groups and stop once the score plateaus
+    :param held_out_file: File of the held-out testing groups of early stopping, distinct from testing_file
+    :param batched: Evaluate with the BatchEvaluator
+    :return:
+    """
+    evaluator = BatchEvaluator if batched else Evaluator
+    training = dict(force=force, checkpoint_epochs=checkpoint_epochs, checkpoint_minutes=checkpoint_minutes)
+    kwargs = grid(WORKERS)
+    directories = corpora(simple_train)
 
     for (name, params) in kwargs:
         print("Parameters : {}".format(", ".join(str(key)+":"+str(value) for key, value in params.items())))
@@ -58,12 +117,15 @@ def run(
         # GREEK
         Greek = W2VModel(
             "greek."+name,
-            ["data/transformed/training-pandora-tb-grc", directories[0]],
+            [GREEK, directories[0]],
             epochs=EPOCHS,
-            parameters=params
+            parameters=params,
+            streaming=streaming,
+            packed=packed,
+            early_stopping=stopping(held_out_file, testing_file, early_stopping)
         )
         if is_training:
-            Greek.train()
+            Greek.train(**training)
         else:
             Greek.load()
         print("Base Greek Done")
@@ -76,16 +138,17 @@ def run(
                 ComCut = W2VModel(
                     basename + name,
                     directory,
-                    epochs=EPOCHS, parameters=params
+                    epochs=EPOCHS, parameters=params, streaming=streaming, packed=packed,
+                    early_stopping=stopping(held_out_file, testing_file, early_stopping)
                 )
                 if is_training:
-                    ComCut.train()
+                    ComCut.train(**training)
                 else:
                     ComCut.load()
 
                 print("Without pretraining done")
 
-                eval1 = Evaluator(ComCut, testing_file)
+                eval1 = evaluator(ComCut, testing_file)
                 eval1.score(evaluation_dir + "/" + basename + "." + name + ".tsv", nomatch=nomatch)
                 print("Evaluation done")
 
@@ -93,15 +156,16 @@ def run(
             ComCut = W2VModel(
                 basename + ".pretrained." + name,
                 directory,
-                epochs=EPOCHS, parameters=params, preload=Greek
+                epochs=EPOCHS, parameters=params, preload=Greek, streaming=streaming, packed=packed,
+                early_stopping=stopping(held_out_file, testing_file, early_stopping)
             )
             if is_training:
-                ComCut.train()
+                ComCut.train(**training)
             else:
                 ComCut.load()
             print("With pretraining done")
 
-            eval1 = Evaluator(ComCut, testing_file)
+            eval1 = evaluator(ComCut, testing_file)
             eval1.score(evaluation_dir + "/" + basename + ".pretrained." + name + ".tsv", nomatch=nomatch)
             print("Evaluation done")
 
@@ -110,15 +174,150 @@ def run(
 
         del Greek
 
+def jobs(simple_train=False, pretrained_only=False, WORKERS=7, evaluation_dir="results"):
+    """ List the (parameter set, corpus) jobs of the grid, each Greek base model coming before the models it pretrains
+
+    :param simple_train: Train only the Complete Cut Corpora
+    :param pretrained_only: Train only on the Greek pretrained
+    :param WORKERS: Number of gensim workers per model
+    :param evaluation_dir: Where to save evaluation
+    :return: List of Job
+    """
+    directories = corpora(simple_train)
+    greek, others = [], []
+    for (name, params) in grid(WORKERS):
+        greek.append(Job("greek." + name, [GREEK, directories[0]], params, None, None))
+        for directory in directories:
+            basename = directory.replace("/", ".")
+            if pretrained_only is False:
+                others.append(Job(
+                    basename + name, directory, params, None,
+                    evaluation_dir + "/" + basename + "." + name + ".tsv"
+                ))
+            others.append(Job(
+                basename + ".pretrained." + name, directory, params, greek[-1],
+                evaluation_dir + "/" + basename + ".pretrained." + name + ".tsv"
+            ))
+    return greek + others
+
+
+def run_job(job, EPOCHS=1500, testing_file="data/testing_groups.txt", is_training=False, nomatch=False, streaming=False,
+            packed=False, force=False, checkpoint_epochs=None, checkpoint_minutes=None, early_stopping=None,
+            held_out_file=None, batched=False):
+    """ Train or load a single model of the grid and evaluate it
+
+    :param job: Job to run
+    :type job: Job
+    :return: Name of the model
+    """
+    preload = None
+    if job.preload is not None:
+        preload = W2VModel(
+            job.preload.name, job.preload.directory, epochs=EPOCHS, parameters=job.preload.params,
+            streaming=streaming, packed=packed, early_stopping=stopping(held_out_file, testing_file, early_stopping)
+        )
+    model = W2VModel(
+        job.name, job.directory,
+        epochs=EPOCHS, parameters=job.params, preload=preload, streaming=streaming, packed=packed,
+        early_stopping=stopping(held_out_file, testing_file, early_stopping)
+    )
+    if is_training:
+        model.train(force=force, checkpoint_epochs=checkpoint_epochs, checkpoint_minutes=checkpoint_minutes)
+    else:
+        model.load()
+    if job.evaluation is not None:
+        evaluator = BatchEvaluator if batched else Evaluator
+        evaluator(model, testing_file).score(job.evaluation, nomatch=nomatch)
+    return job.name
+
+
+def schedule(
+        simple_train=False,
+        pretrained_only=False,
+        EPOCHS=1500,
+        testing_file="data/testing_groups.txt",
+        evaluation_dir="results",
+        is_training=False,
+        nomatch=False,
+        streaming=False,
+        packed=False,
+        force=False,
+        checkpoint_epochs=None,
+        checkpoint_minutes=None,
+        early_stopping=None,
+        held_out_file=None,
+        batched=False,
+        jobs_count=2,
+        cores=None
+):
+    """ Run training or evaluation of the grid with several jobs at once in a process pool
+
+    The cores are split between the concurrent jobs, each job using cores // jobs_count gensim workers.
+    Pretrained models are only started once their Greek base model is done.
+
+    :param jobs_count: Number of concurrent jobs
+    :param cores: Number of cores to share (Default: all of them)
+    :return:
+    """
+    if cores is None:
+        cores = cpu_count()
+    workers = max(1, cores // jobs_count)
+    print("Running {} jobs at once with {} workers each".format(jobs_count, workers))
+    stopping(held_out_file, testing_file, early_stopping)  # Fails before any job starts
+
+    pending = jobs(simple_train, pretrained_only, workers, evaluation_dir)
+    done, running = set(), {}
+    with ProcessPoolExecutor(max_workers=jobs_count) as executor:
+        while pending or running:
+            for job in [job for job in pending if job.preload is None or job.preload.name in done]:
+                pending.remove(job)
+                if job.evaluation is None and not is_training:
+                    # Greek base models are only used as preload when training
+                    done.add(job.name)
+                    continue
+                running[executor.submit(
+                    run_job, job, EPOCHS=EPOCHS, testing_file=testing_file, is_training=is_training,
+                    nomatch=nomatch, streaming=streaming, packed=packed, force=force,
+                    checkpoint_epochs=checkpoint_epochs, checkpoint_minutes=checkpoint_minutes,
+                    early_stopping=early_stopping, held_out_file=held_out_file, batched=batched
+                )] = job
+            if not running:
+                if pending:
+                    raise ValueError("Unreachable jobs : {}".format(", ".join(job.name for job in pending)))
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                future.result()
+                done.add(job.name)
+                print("{} done ({} remaining)".format(job.name, len(pending) + len(running)))
+
+
 parser = ArgumentParser()
 parser.add_argument("--simple", default=False, action="store_true", dest="simple_train", help="Only train on the complete cut corpora")
 parser.add_argument("--pretrained", default=True, action="store_false", dest="pretrained_only", help="Only train the pretrained models")
-parser.add_argument("--epochs", dest="EPOCHS", default=1500, help="Number of training epochs")
-parser.add_argument("--workers", dest="WORKERS", default=7, help="Number of training workers")
+parser.add_argument("--epochs", dest="EPOCHS", default=1500, type=int, help="Number of training epochs")
+parser.add_argument("--workers", dest="WORKERS", default=7, type=int, help="Number of training workers")
 parser.add_argument("--train", dest="is_training", default=False, action="store_true", help="Train the corpus")
 parser.add_argument("--testing", dest="testing_file", default="data/testing_groups.txt", help="File to test against")
 parser.add_argument("--evdir", dest="evaluation_dir", default="results", help="Directory for output")
 parser.add_argument("--no-match", dest="nomatch", action="store_true", default=False, help="Compute match over four words using gensim")
+parser.add_argument("--force", dest="force", action="store_true", default=False, help="Retrain models even if their inputs did not change")
+parser.add_argument("--checkpoint-epochs", dest="checkpoint_epochs", default=None, type=int, help="Save a resumable checkpoint every N epochs")
+parser.add_argument("--checkpoint-minutes", dest="checkpoint_minutes", default=None, type=float, help="Save a resumable checkpoint every N minutes")
+parser.add_argument("--early-stopping", dest="early_stopping", default=None, type=int, help="Evaluate every N epochs on held-out testing groups and stop once the score plateaus")
+parser.add_argument("--held-out", dest="held_out_file", default=None, help="File of the held-out testing groups of --early-stopping, distinct from --testing")
+parser.add_argument("--batched", dest="batched", action="store_true", default=False, help="Compute all neighbours of the testing words at once when evaluating")
+parser.add_argument("--jobs", dest="jobs_count", default=1, type=int, help="Number of models to train or evaluate at once")
+parser.add_argument("--cores", dest="cores", default=None, type=int, help="Number of cores to split between jobs (Default: all)")
+parser.add_argument("--streaming", dest="streaming", action="store_true", default=False, help="Read the corpora lazily instead of keeping them in memory")
+parser.add_argument("--packed", dest="packed", action="store_true", default=False, help="Read the packed corpora written by build.py --packed")
 
 if __name__ == "__main__":
-    run(**vars(parser.parse_args()))
+    args = vars(parser.parse_args())
+    if args["jobs_count"] > 1:
+        del args["WORKERS"]
+        schedule(**args)
+    else:
+        del args["jobs_count"], args["cores"]
+        run(**args)